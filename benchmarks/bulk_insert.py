@@ -0,0 +1,43 @@
+"""
+Compares inserting N planets one POST /planets at a time against a single
+POST /planets/bulk, both through the Flask test client on a throwaway
+SQLite database.
+
+    $ python benchmarks/bulk_insert.py --count 2000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--count', type=int, default=2000)
+args = parser.parse_args()
+
+fd, db_path = tempfile.mkstemp(suffix='.db')
+os.close(fd)
+os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from app import app  # noqa: E402
+from models import db  # noqa: E402
+
+with app.app_context():
+    db.create_all()
+client = app.test_client()
+
+start = time.perf_counter()
+for i in range(args.count):
+    client.post('/planets', json={'name': f'single-{i}', 'population': i})
+single = time.perf_counter() - start
+
+start = time.perf_counter()
+response = client.post('/planets/bulk', json=[{'name': f'bulk-{i}', 'population': i} for i in range(args.count)])
+bulk = time.perf_counter() - start
+assert response.status_code == 201, response.get_json()
+
+print(f'single: {args.count / single:10.0f} rows/s ({single:.2f}s)')
+print(f'bulk:   {args.count / bulk:10.0f} rows/s ({bulk:.2f}s)')
+print(f'speedup: {single / bulk:.1f}x')
+os.remove(db_path)
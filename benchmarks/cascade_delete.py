@@ -0,0 +1,79 @@
+"""
+Time, queries and peak memory of deleting an entity with many favorites.
+
+Seeds a temporary sqlite database where one character, one planet and one
+vehicle are favorited by --favorites users and one user has --favorites
+favorite characters, then deletes each through the API. The favorites are
+removed by the database (ON DELETE CASCADE), so the delete is a constant
+number of queries and nothing is loaded into the session.
+
+    $ python benchmarks/cascade_delete.py --favorites 100000
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument('--favorites', type=int, default=100000)
+args = parser.parse_args()
+
+fd, DB_PATH = tempfile.mkstemp(suffix='.db')
+os.close(fd)
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+os.environ.setdefault('METRICS_DIR', tempfile.mkdtemp())
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+from sqlalchemy import insert, select, func  # noqa: E402
+from app import app  # noqa: E402
+from models import db, User, Characters, Planets, Vehicle, FavoriteCharacters, FavoritePlanets, FavoriteVehicles  # noqa: E402
+
+def seed():
+    n = args.favorites
+    with app.app_context():
+        db.create_all()
+        db.session.execute(insert(User), [
+            {"user_name": f"user{i}", "email": f"user{i}@example.com", "password": "x", "is_active": True} for i in range(n)])
+        db.session.execute(insert(Characters), [{"first_name": f"Character{i}", "specie": "Human", "height": 1} for i in range(n)])
+        db.session.execute(insert(Planets), [{"name": "Tatooine", "population": 1}])
+        db.session.execute(insert(Vehicle), [{"name": "X-wing", "max_speed": 1, "driver_id": 2}])
+        # everybody likes character 1, the planet and the vehicle, user 1 likes every character
+        db.session.execute(insert(FavoriteCharacters), [{"user_id": i, "character_id": 1} for i in range(2, n + 1)])
+        db.session.execute(insert(FavoriteCharacters), [{"user_id": 1, "character_id": i} for i in range(1, n + 1)])
+        db.session.execute(insert(FavoritePlanets), [{"user_id": i, "planet_id": 1} for i in range(1, n + 1)])
+        db.session.execute(insert(FavoriteVehicles), [{"user_id": i, "vehicle_id": 1} for i in range(1, n + 1)])
+        db.session.commit()
+
+def favorites_left():
+    with app.app_context():
+        return sum(db.session.scalar(select(func.count()).select_from(model))
+                   for model in (FavoriteCharacters, FavoritePlanets, FavoriteVehicles))
+
+def main():
+    started = time.perf_counter()
+    seed()
+    print(f"seeded {favorites_left()} favorites in {time.perf_counter() - started:.1f}s")
+    client = app.test_client()
+    print(f"{'delete':22} {'ms':>9} {'queries':>8} {'peak MB':>8} {'favorites left':>15}")
+    for name, path in (("user (n favorites)", '/users/1'),
+                       ("character (n fans)", '/people/1'),
+                       ("planet (n fans)", '/planets/1'),
+                       ("vehicle (n fans)", '/vehicles/1')):
+        tracemalloc.start()
+        start = time.perf_counter()
+        response = client.delete(path)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        assert response.status_code == 200, response.get_json()
+        queries = re.search(r'desc="(\d+) queries"', response.headers['Server-Timing']).group(1)
+        print(f"{name:22} {elapsed * 1000:9.1f} {queries:>8} {peak / 2 ** 20:8.1f} {favorites_left():15}")
+    os.remove(DB_PATH)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Bytes on the wire and latency of the large JSON routes per encoding.
+
+Seeds a temporary sqlite database, then requests every route --requests
+times with each Accept-Encoding through the Flask test client and reports
+the response size, its ratio to the uncompressed body, and the p50 latency
+twice: with the compressed bytes reused from the (ETag, encoding) cache,
+and with the cache cleared before every request (compressing every time).
+The NDJSON export is streamed and has no ETag, so it is always compressed.
+
+    $ python benchmarks/compression.py --rows 1000 --requests 50
+
+brotli and zstd are only offered when their packages are installed.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument('--rows', type=int, default=1000, help="characters, planets and vehicles, and favorites of user 1")
+parser.add_argument('--requests', type=int, default=50, help="requests per route and encoding")
+args = parser.parse_args()
+
+fd, DB_PATH = tempfile.mkstemp(suffix='.db')
+os.close(fd)
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+os.environ.setdefault('METRICS_DIR', tempfile.mkdtemp())
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+from sqlalchemy import insert  # noqa: E402
+from app import app  # noqa: E402
+from compression import ENCODERS, compressed_cache  # noqa: E402
+from models import db, User, Characters, Planets, Vehicle, FavoriteCharacters, FavoritePlanets, FavoriteVehicles  # noqa: E402
+from versioning import bump_version  # noqa: E402
+
+def seed():
+    n = args.rows
+    with app.app_context():
+        db.create_all()
+        db.session.execute(insert(User), [{"user_name": "user1", "email": "user1@example.com", "password": "x", "is_active": True}])
+        db.session.execute(insert(Characters), [
+            {"first_name": f"Character{i}", "last_name": "Skywalker", "specie": "Human", "height": 170 + i % 30} for i in range(n)])
+        db.session.execute(insert(Planets), [
+            {"name": f"Planet{i}", "population": i * 1000, "climate": "temperate"} for i in range(n)])
+        db.session.execute(insert(Vehicle), [{"name": f"Vehicle{i}", "max_speed": 1000 + i, "driver_id": i + 1} for i in range(n)])
+        db.session.execute(insert(FavoriteCharacters), [{"user_id": 1, "character_id": i} for i in range(1, n + 1)])
+        db.session.execute(insert(FavoritePlanets), [{"user_id": 1, "planet_id": i} for i in range(1, n + 1)])
+        db.session.execute(insert(FavoriteVehicles), [{"user_id": 1, "vehicle_id": i} for i in range(1, n + 1)])
+        bump_version(Characters, Planets, Vehicle)
+        db.session.commit()
+
+def measure(client, path, encoding, clear_cache):
+    headers = {'Accept-Encoding': encoding}
+    latencies = []
+    size = 0
+    for _ in range(args.requests):
+        if clear_cache:
+            compressed_cache.delete_where(lambda key: True)
+        start = time.perf_counter()
+        response = client.get(path, headers=headers)
+        size = len(response.get_data())
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.status_code
+        assert response.headers.get('Content-Encoding') == (None if encoding == 'identity' else encoding)
+    return size, statistics.median(latencies) * 1000
+
+def main():
+    seed()
+    client = app.test_client()
+    limit = min(args.rows, 1000)
+    paths = [f'/people?limit={limit}', f'/planets?limit={limit}', f'/vehicles?limit={limit}',
+             '/user/1/favorites', '/export/planets.ndjson']
+    print(f"{'route':26} {'encoding':9} {'bytes':>9} {'ratio':>6} {'p50 ms cached':>14} {'p50 ms compressing':>19}")
+    for path in paths:
+        plain = None
+        for encoding in ('identity',) + tuple(ENCODERS):
+            size, cached = measure(client, path, encoding, clear_cache=False)
+            _, cold = measure(client, path, encoding, clear_cache=True)
+            plain = plain or size
+            print(f"{path:26} {encoding:9} {size:9} {size / plain:6.3f} {cached:14.2f} {cold:19.2f}")
+    os.remove(DB_PATH)
+
+if __name__ == '__main__':
+    main()
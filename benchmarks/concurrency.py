@@ -0,0 +1,188 @@
+"""
+Compares the sync (gunicorn + wsgi.py) and async (uvicorn + asgi.py) serving
+modes under many concurrent connections.
+
+Seeds a database, starts each server in turn with the same number of worker
+processes and keeps --connections clients busy for --duration seconds on a
+mix of the read endpoints. Every request opens its own connection, the sync
+workers do not keep connections alive.
+
+    $ python benchmarks/concurrency.py --connections 500 --workers 4 --duration 20
+    $ python benchmarks/concurrency.py --database-url postgresql://localhost/empty_db
+
+--database-url must point to an empty database, the tables are created and
+filled by the benchmark. A temporary sqlite file is used by default.
+
+Results with the defaults (2 workers, 15s per mode, sqlite, 1 vCPU):
+
+    connections  mode   requests  req/s  p50 ms  p95 ms  p99 ms  errors
+    500          sync       4352    257    1896    2000    2041       0
+    500          async      2561    151    2975    7034    8652       0
+    1000         sync       4905    270    3566    3994    4051       0
+    1000         async      3232    170    5625   11042   13218       0
+
+Both accept every connection without errors; the single core is the limit,
+not the number of connections. On it the async mode is slower, aiosqlite
+hands every query to a thread and the event loop adds its own CPU. The
+async mode is meant for a database with network latency (asyncpg on
+postgres), measure it there before choosing it.
+"""
+import argparse
+import asyncio
+import os
+import random
+import resource
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+SRC = os.path.join(ROOT, 'src')
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument('--connections', type=int, default=500)
+parser.add_argument('--duration', type=float, default=15, help="seconds per mode")
+parser.add_argument('--workers', type=int, default=2, help="worker processes of each server")
+parser.add_argument('--rows', type=int, default=5000, help="characters, planets and vehicles to seed")
+parser.add_argument('--users', type=int, default=200)
+parser.add_argument('--modes', default='sync,async')
+parser.add_argument('--database-url', default=None)
+args = parser.parse_args()
+
+if args.database_url:
+    DATABASE_URL = args.database_url
+    DB_PATH = None
+else:
+    fd, DB_PATH = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    DATABASE_URL = f'sqlite:///{DB_PATH}'
+os.environ['DATABASE_URL'] = DATABASE_URL
+os.environ.setdefault('METRICS_DIR', tempfile.mkdtemp())
+sys.path.insert(0, SRC)
+
+from sqlalchemy import insert  # noqa: E402
+from app import app  # noqa: E402
+from models import db, User, Characters, Planets, Vehicle, FavoriteCharacters, FavoritePlanets, FavoriteVehicles  # noqa: E402
+
+def seed():
+    random.seed(42)
+    with app.app_context():
+        db.create_all()
+        db.session.execute(insert(User), [
+            {"user_name": f"user{i}", "email": f"user{i}@example.com", "password": "x", "is_active": True}
+            for i in range(args.users)])
+        db.session.execute(insert(Characters), [
+            {"first_name": f"Character{i}", "specie": random.choice(["Human", "Wookiee", "Droid"]), "height": i}
+            for i in range(args.rows)])
+        db.session.execute(insert(Planets), [
+            {"name": f"Planet{i}", "population": random.randint(0, 10 ** 9), "climate": "arid"} for i in range(args.rows)])
+        db.session.execute(insert(Vehicle), [
+            {"name": f"Vehicle{i}", "max_speed": random.randint(100, 1500), "driver_id": i + 1} for i in range(args.rows)])
+        for model, column in ((FavoriteCharacters, 'character_id'), (FavoritePlanets, 'planet_id'), (FavoriteVehicles, 'vehicle_id')):
+            db.session.execute(insert(model), [
+                {"user_id": user_id, column: target}
+                for user_id in range(1, args.users + 1) for target in random.sample(range(1, args.rows + 1), 10)])
+        db.session.commit()
+
+def random_path():
+    rand = lambda count: random.randint(1, count)  # noqa: E731
+    return random.choice((
+        lambda: f'/people?limit=20&after={rand(args.rows)}',
+        lambda: f'/people/{rand(args.rows)}',
+        lambda: f'/planets?population__gte={rand(10 ** 9)}&sort=population&limit=20',
+        lambda: f'/planets/{rand(args.rows)}',
+        lambda: f'/vehicles/{rand(args.rows)}',
+        lambda: f'/users/{rand(args.users)}',
+        lambda: f'/user/{rand(args.users)}/favorites',
+    ))()
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def server_command(mode, port):
+    if mode == 'sync':
+        return ['gunicorn', '--chdir', SRC, '-w', str(args.workers), '-b', f'127.0.0.1:{port}',
+                '--backlog', '4096', '--log-level', 'warning', 'wsgi']
+    return ['uvicorn', 'asgi:application', '--app-dir', SRC, '--workers', str(args.workers),
+            '--host', '127.0.0.1', '--port', str(port), '--backlog', '4096', '--log-level', 'warning', '--no-access-log']
+
+async def fetch(port, path):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n'.encode())
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+async def wait_ready(port):
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            await fetch(port, '/users/1')
+            return
+        except (OSError, IndexError, ValueError):
+            await asyncio.sleep(0.2)
+    raise SystemExit("the server did not start")
+
+async def load(port):
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + args.duration
+
+    async def client():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                status = await fetch(port, random_path())
+            except (OSError, IndexError, ValueError):
+                status = None
+            if status == 200:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(args.connections)))
+    return latencies, errors, time.perf_counter() - started
+
+def report(mode, latencies, errors, elapsed):
+    latencies.sort()
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000 if latencies else float('nan')
+    print(f"{mode:6} {len(latencies):9} {len(latencies) / elapsed:9.1f} {percentile(50):9.1f} "
+          f"{percentile(95):9.1f} {percentile(99):9.1f} {errors:7}")
+
+def main():
+    # every connection is a file descriptor on both sides
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    seed()
+    print(f"{args.connections} connections, {args.workers} workers, {args.duration:.0f}s per mode")
+    print(f"{'mode':6} {'requests':>9} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for mode in args.modes.split(','):
+        port = free_port()
+        command = server_command(mode, port)
+        if shutil.which(command[0]) is None:
+            print(f"{mode:6} skipped, {command[0]} is not installed")
+            continue
+        process = subprocess.Popen(command, env=dict(os.environ, DATABASE_URL=DATABASE_URL), start_new_session=True)
+        try:
+            asyncio.run(wait_ready(port))
+            report(mode, *asyncio.run(load(port)))
+        finally:
+            os.killpg(process.pid, signal.SIGTERM)
+            process.wait(timeout=30)
+    if DB_PATH:
+        os.remove(DB_PATH)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""
+Compares gunicorn profiles of src/gunicorn_config.py on the existing routes.
+
+For every profile it starts gunicorn with the config and the profile's
+environment and reports the boot time (start until the first response) and
+the memory of the master and its workers (proportional set size, so pages
+shared after a preload are split between the processes). Then it runs
+benchmarks/run.py --mode gunicorn with that config and summarizes its per
+route results: the median over the routes of p50, p95 and requests/s.
+
+    $ python benchmarks/gunicorn_profiles.py --workers 4 --concurrency 16 --requests 200
+    $ python benchmarks/gunicorn_profiles.py --profiles sync,gthread --details
+
+The gevent profile is skipped when gevent is not installed.
+"""
+import argparse
+import http.client
+import importlib.util
+import json
+import os
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+SRC = os.path.join(ROOT, 'src')
+CONFIG = os.path.join(SRC, 'gunicorn_config.py')
+RUN = os.path.join(ROOT, 'benchmarks', 'run.py')
+
+PROFILES = {
+    'sync': {"GUNICORN_WORKER_CLASS": "sync", "GUNICORN_PRELOAD": "false"},
+    'sync-preload': {"GUNICORN_WORKER_CLASS": "sync", "GUNICORN_PRELOAD": "true"},
+    'gthread': {"GUNICORN_WORKER_CLASS": "gthread", "GUNICORN_THREADS": "4", "GUNICORN_PRELOAD": "true"},
+    'gevent': {"GUNICORN_WORKER_CLASS": "gevent", "GUNICORN_PRELOAD": "true"},
+}
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument('--profiles', default=','.join(PROFILES), help="comma separated, all by default")
+parser.add_argument('--workers', type=int, default=2)
+parser.add_argument('--concurrency', type=int, default=8)
+parser.add_argument('--requests', type=int, default=100, help="requests per route")
+parser.add_argument('--routes', default=None, help="comma separated endpoints, all by default")
+parser.add_argument('--details', action='store_true', help="also print run.py's per route table")
+args = parser.parse_args()
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def pss_kb(pid):
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as file:
+            for line in file:
+                if line.startswith('Pss:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+def children(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as file:
+            return [int(child) for child in file.read().split()]
+    except OSError:
+        return []
+
+def boot(env):
+    # seconds until the first response and MB of the master plus its workers
+    fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    port = free_port()
+    env = dict(env, DATABASE_URL=f'sqlite:///{db_path}', PORT=str(port), WEB_CONCURRENCY=str(args.workers))
+    start = time.perf_counter()
+    process = subprocess.Popen(['gunicorn', '-c', CONFIG, '--chdir', SRC, '--log-level', 'warning', 'wsgi'],
+                               env=env, start_new_session=True)
+    try:
+        while True:
+            if time.perf_counter() - start > 30:
+                raise SystemExit("gunicorn did not start")
+            try:
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+                connection.request('GET', '/')
+                connection.getresponse().read()
+                connection.close()
+                break
+            except OSError:
+                time.sleep(0.05)
+        booted = time.perf_counter() - start
+        # let every worker finish booting before measuring
+        deadline = time.time() + 10
+        while len(children(process.pid)) < args.workers and time.time() < deadline:
+            time.sleep(0.1)
+        time.sleep(1)
+        memory = sum(pss_kb(pid) for pid in [process.pid] + children(process.pid)) / 1024
+    finally:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=30)
+        os.remove(db_path)
+    return booted, memory
+
+def load(env):
+    # an empty directory: no baseline to compare with
+    workdir = tempfile.mkdtemp()
+    output = os.path.join(workdir, 'results.json')
+    command = [sys.executable, RUN, '--mode', 'gunicorn', '--workers', str(args.workers),
+               '--concurrency', str(args.concurrency), '--requests', str(args.requests),
+               '--gunicorn-args', f'-c {CONFIG}', '--baseline', os.path.join(workdir, 'baseline.json'), '--output', output]
+    if args.routes:
+        command += ['--routes', args.routes]
+    result = subprocess.run(command, env=env, capture_output=not args.details, text=True)
+    if result.returncode != 0:
+        sys.exit(f"run.py failed:\n{result.stderr}")
+    with open(output) as file:
+        routes = json.load(file)['gunicorn']['routes']
+    shutil.rmtree(workdir)
+    return routes
+
+def main():
+    names = args.profiles.split(',')
+    summary = []
+    for name in names:
+        profile = PROFILES[name]
+        if profile["GUNICORN_WORKER_CLASS"] == 'gevent' and importlib.util.find_spec('gevent') is None:
+            print(f"{name}: skipped, gevent is not installed")
+            continue
+        env = dict(os.environ, **profile)
+        if args.details:
+            print(f"\n######## {name}")
+        booted, memory = boot(env)
+        routes = load(env)
+        errors = sum(1 for route in routes.values() if any(status >= 500 for status in route['statuses']))
+        summary.append((name, booted, memory,
+                        statistics.median(route['p50_ms'] for route in routes.values()),
+                        statistics.median(route['p95_ms'] for route in routes.values()),
+                        statistics.median(route['throughput_rps'] for route in routes.values()),
+                        sum(route['throughput_rps'] for route in routes.values()) / len(routes),
+                        errors))
+
+    print(f"\nworkers={args.workers} concurrency={args.concurrency} requests per route={args.requests}")
+    print(f"{'profile':14} {'boot ms':>8} {'memory MB':>10} {'p50 ms':>8} {'p95 ms':>8} {'median req/s':>13} "
+          f"{'mean req/s':>11} {'routes 5xx':>11}")
+    for name, booted, memory, p50, p95, median_rps, mean_rps, errors in summary:
+        print(f"{name:14} {booted * 1000:8.0f} {memory:10.1f} {p50:8.2f} {p95:8.2f} {median_rps:13.1f} "
+              f"{mean_rps:11.1f} {errors:11}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,367 @@
+"""
+Benchmark suite for every route in src/app.py.
+
+Seeds a throwaway SQLite database with N users, characters, planets and
+vehicles plus M favorites of each type per user, then drives every route
+through the Flask test client and/or a real gunicorn process serving
+src/wsgi.py. Reports p50/p95/p99 latency, throughput and SQL queries per
+request (read from the Server-Timing header).
+
+    $ python benchmarks/run.py --mode client --requests 200
+    $ python benchmarks/run.py --mode gunicorn --workers 4 --concurrency 16 --save-baseline
+    $ python benchmarks/run.py --mode gunicorn --workers 4 --concurrency 16   # compares
+
+Results are compared with benchmarks/baselines/baseline.json when it exists:
+a route whose p95 grows more than --threshold (and more than --min-delta-ms),
+or that runs more queries per request than before, fails the run.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import re
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+SRC = os.path.join(ROOT, 'src')
+BASELINES = os.path.join(ROOT, 'benchmarks', 'baselines')
+QUERIES = re.compile(r'desc="(\d+) queries"')
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument('--mode', choices=('client', 'gunicorn', 'both'), default='client')
+parser.add_argument('--users', type=int, default=100)
+parser.add_argument('--characters', type=int, default=2000)
+parser.add_argument('--planets', type=int, default=2000)
+parser.add_argument('--vehicles', type=int, default=2000)
+parser.add_argument('--favorites', type=int, default=20, help="favorites of each type per user")
+parser.add_argument('--requests', type=int, default=100, help="requests per route")
+parser.add_argument('--workers', type=int, default=2, help="gunicorn workers")
+parser.add_argument('--concurrency', type=int, default=8, help="concurrent clients in gunicorn mode")
+parser.add_argument('--gunicorn-args', default='', help="extra arguments for gunicorn")
+parser.add_argument('--routes', default=None, help="comma separated endpoints to run, all by default")
+parser.add_argument('--baseline', default=None, help="baseline file, benchmarks/baselines/baseline.json by default")
+parser.add_argument('--save-baseline', action='store_true')
+parser.add_argument('--threshold', type=float, default=0.25, help="allowed p95 growth, 0.25 = 25%%")
+parser.add_argument('--min-delta-ms', type=float, default=2.0, help="ignore p95 changes smaller than this")
+parser.add_argument('--output', default=None, help="also write the results to this file")
+args = parser.parse_args()
+
+fd, DB_PATH = tempfile.mkstemp(suffix='.db')
+os.close(fd)
+DATABASE_URL = f'sqlite:///{DB_PATH}'
+os.environ['DATABASE_URL'] = DATABASE_URL
+os.environ.setdefault('METRICS_DIR', tempfile.mkdtemp())
+# the /_internal/* and /metrics routes only answer to this token
+os.environ.setdefault('INTERNAL_TOKEN', 'benchmark')
+HEADERS = {'Authorization': f"Bearer {os.environ['INTERNAL_TOKEN']}"}
+sys.path.insert(0, SRC)
+
+from sqlalchemy import insert  # noqa: E402
+from app import app  # noqa: E402
+from models import db, User, Characters, Planets, Vehicle, FavoriteCharacters, FavoriteVehicles, FavoritePlanets  # noqa: E402
+from search import rebuild_index  # noqa: E402
+
+def seed():
+    random.seed(42)
+    with app.app_context():
+        db.create_all()
+        db.session.execute(insert(User), [
+            {"user_name": f"user{i}", "email": f"user{i}@example.com", "password": "x", "is_active": True}
+            for i in range(args.users)])
+        db.session.execute(insert(Characters), [
+            {"first_name": f"Character{i}", "last_name": f"Last{i}", "specie": random.choice(["Human", "Wookiee", "Droid"]), "height": random.randint(60, 250)}
+            for i in range(args.characters)])
+        db.session.execute(insert(Planets), [
+            {"name": f"Planet{i}", "population": random.randint(0, 10 ** 9), "climate": random.choice(["arid", "temperate", "frozen"])}
+            for i in range(args.planets)])
+        db.session.execute(insert(Vehicle), [
+            {"name": f"Vehicle{i}", "max_speed": random.randint(100, 1500), "driver_id": i + 1 if i < args.characters else None}
+            for i in range(args.vehicles)])
+        for model, column, count in ((FavoriteCharacters, 'character_id', args.characters),
+                                     (FavoriteVehicles, 'vehicle_id', args.vehicles),
+                                     (FavoritePlanets, 'planet_id', args.planets)):
+            rows = []
+            for user_id in range(1, args.users + 1):
+                for target in random.sample(range(1, count + 1), min(args.favorites, count)):
+                    rows.append({"user_id": user_id, column: target})
+            if rows:
+                db.session.execute(insert(model), rows)
+        db.session.commit()
+        rebuild_index()
+    # the favorites were inserted directly, compute their favorite_count
+    app.test_cli_runner().invoke(args=['popularity', 'reconcile'])
+
+def make_pool(model, rows):
+    # rows created up front for the DELETE routes, one per request
+    with app.app_context():
+        ids = db.session.scalars(insert(model).returning(model.id, sort_by_parameter_order=True), rows).all()
+        db.session.commit()
+    return ids
+
+def routes():
+    n = args.requests
+    users, characters, planets, vehicles = args.users, args.characters, args.planets, args.vehicles
+    rand = lambda count: random.randint(1, count)  # noqa: E731
+    counter = iter(range(10 ** 9))
+
+    def unique():
+        return f"{os.getpid()}-{next(counter)}-{random.random()}"
+
+    pools = {
+        'users': make_pool(User, [{"user_name": f"del{i}", "email": f"del{unique()}@example.com", "password": "x", "is_active": True} for i in range(n)]),
+        'people': make_pool(Characters, [{"first_name": f"Del{i}", "specie": "Human", "height": 1} for i in range(n)]),
+        'planets': make_pool(Planets, [{"name": f"DelPlanet{unique()}", "population": 1} for i in range(n)]),
+        'vehicles': make_pool(Vehicle, [{"name": f"DelVehicle{unique()}", "max_speed": 1} for i in range(n)]),
+    }
+    # favorites of user 1 on entities nobody else uses, deleted one per request
+    fav_people = make_pool(Characters, [{"first_name": f"Fav{i}", "specie": "Human", "height": 1} for i in range(n)])
+    fav_planets = make_pool(Planets, [{"name": f"FavPlanet{unique()}", "population": 1} for i in range(n)])
+    fav_vehicles = make_pool(Vehicle, [{"name": f"FavVehicle{unique()}", "max_speed": 1} for i in range(n)])
+    pools['favorite_people'] = make_pool(FavoriteCharacters, [{"user_id": 1, "character_id": id} for id in fav_people])
+    pools['favorite_planets'] = make_pool(FavoritePlanets, [{"user_id": 1, "planet_id": id} for id in fav_planets])
+    pools['favorite_vehicles'] = make_pool(FavoriteVehicles, [{"user_id": 1, "vehicle_id": id} for id in fav_vehicles])
+    return {
+        # endpoint: (method, function returning (path, body))
+        'sitemap': ('GET', lambda i: ('/', None)),
+        'get_cache_stats': ('GET', lambda i: ('/_internal/cache', None)),
+        'get_pool_stats': ('GET', lambda i: ('/_internal/pool', None)),
+        'get_metrics': ('GET', lambda i: ('/metrics', None)),
+        'get_users': ('GET', lambda i: ('/users', None)),
+        'get_user_id': ('GET', lambda i: (f'/users/{rand(users)}', None)),
+        'add_user': ('POST', lambda i: ('/users', {"user_name": "bench", "email": f"{unique()}@example.com", "password": "x"})),
+        'update_user': ('PUT', lambda i: (f'/users/{rand(users)}', {"user_name": f"u{i}"})),
+        'delete_user': ('DELETE', lambda i: (f'/users/{pools["users"][i]}', None)),
+        'get_characters': ('GET', lambda i: ('/people?specie=Human&sort=specie', None)),
+        'get_character_id': ('GET', lambda i: (f'/people/{rand(characters)}', None)),
+        'add_character': ('POST', lambda i: ('/people', {"first_name": "Bench", "specie": "Human", "height": 180})),
+        'add_characters_bulk': ('POST', lambda i: ('/people/bulk', [{"first_name": "Bench", "specie": "Human", "height": 1}] * 100)),
+        'update_character': ('PUT', lambda i: (f'/people/{rand(characters)}', {"height": i})),
+        'delete_character': ('DELETE', lambda i: (f'/people/{pools["people"][i]}', None)),
+        'get_planets': ('GET', lambda i: ('/planets?limit=100', None)),
+        'get_planets_id': ('GET', lambda i: (f'/planets/{rand(planets)}', None)),
+        'add_planet': ('POST', lambda i: ('/planets', {"name": f"Bench{unique()}", "population": 1})),
+        'add_planets_bulk': ('POST', lambda i: ('/planets/bulk', [{"name": f"Bench{unique()}", "population": 1} for _ in range(100)])),
+        'update_planet': ('PUT', lambda i: (f'/planets/{rand(planets)}', {"population": i})),
+        'delete_planet': ('DELETE', lambda i: (f'/planets/{pools["planets"][i]}', None)),
+        'get_vehicles': ('GET', lambda i: ('/vehicles?max_speed__gte=1000', None)),
+        'get_vehicles_id': ('GET', lambda i: (f'/vehicles/{rand(vehicles)}', None)),
+        'add_vehicle': ('POST', lambda i: ('/vehicles', {"name": f"Bench{unique()}", "max_speed": 1})),
+        'add_vehicles_bulk': ('POST', lambda i: ('/vehicles/bulk', [{"name": f"Bench{unique()}", "max_speed": 1} for _ in range(100)])),
+        'update_vehicle': ('PUT', lambda i: (f'/vehicles/{rand(vehicles)}', {"max_speed": i})),
+        'delete_vehicle': ('DELETE', lambda i: (f'/vehicles/{pools["vehicles"][i]}', None)),
+        'get_user_favorites': ('GET', lambda i: (f'/user/{rand(users)}/favorites', None)),
+        # not user 1, whose favorites the DELETE routes consume
+        'replace_user_favorites': ('PUT', lambda i: (f'/user/{random.randint(2, max(users, 2))}/favorites', {
+            "character_ids": random.sample(range(1, characters + 1), min(args.favorites, characters)),
+            "planet_ids": random.sample(range(1, planets + 1), min(args.favorites, planets)),
+            "vehicle_ids": random.sample(range(1, vehicles + 1), min(args.favorites, vehicles)),
+        })),
+        'add_user_favorite_characters': ('POST', lambda i: (f'/user/{rand(users)}/favorites/people', {"character_id": rand(characters)})),
+        'add_user_favorite_vehicles': ('POST', lambda i: (f'/user/{rand(users)}/favorites/vehicles', {"vehicle_id": rand(vehicles)})),
+        'add_user_favorite_planets': ('POST', lambda i: (f'/user/{rand(users)}/favorites/planets', {"planet_id": rand(planets)})),
+        'delete_user_favorite_character': ('DELETE', lambda i: (f'/user/1/favorites/people/{pools["favorite_people"][i]}', None)),
+        'delete_user_favorite_vehicle': ('DELETE', lambda i: (f'/user/1/favorites/vehicles/{pools["favorite_vehicles"][i]}', None)),
+        'delete_user_favorite_planet': ('DELETE', lambda i: (f'/user/1/favorites/planets/{pools["favorite_planets"][i]}', None)),
+        'get_popular': ('GET', lambda i: (f'/popular/{random.choice(("people", "planets", "vehicles"))}?limit=10', None)),
+        'batch': ('POST', lambda i: ('/batch', [
+            {"method": "GET", "path": f"/users/{rand(users)}"},
+            {"method": "GET", "path": f"/user/{rand(users)}/favorites"},
+            {"method": "GET", "path": f"/people/{rand(characters)}"},
+            {"method": "GET", "path": f"/planets/{rand(planets)}"},
+            {"method": "PUT", "path": f"/people/{rand(characters)}", "body": {"height": i}},
+        ])),
+        'search_all': ('GET', lambda i: ('/search?q=planet1&limit=20', None)),
+        'export_entity': ('GET', lambda i: ('/export/planets.ndjson', None)),
+    }
+
+def check_coverage(table):
+    endpoints = {rule.endpoint.removeprefix('api.') for rule in app.url_map.iter_rules()
+                 if rule.endpoint.startswith('api.')}
+    missing = sorted(endpoints - set(table))
+    if missing:
+        print(f"warning: routes without a benchmark: {', '.join(missing)}", file=sys.stderr)
+
+def summarize(latencies, queries, statuses, elapsed):
+    latencies = sorted(latencies)
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(round(p / 100 * (len(latencies) - 1))))] * 1000
+    return {
+        "requests": len(latencies),
+        "p50_ms": round(percentile(50), 3),
+        "p95_ms": round(percentile(95), 3),
+        "p99_ms": round(percentile(99), 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "queries_per_request": round(statistics.mean(queries), 2) if queries else None,
+        "errors": sum(1 for status in statuses if status >= 500),
+        "statuses": sorted(set(statuses)),
+    }
+
+def parse_queries(header):
+    match = QUERIES.search(header or '')
+    return int(match.group(1)) if match else None
+
+def run_client(table):
+    client = app.test_client()
+    results = {}
+    for endpoint, (method, make) in table.items():
+        latencies, queries, statuses = [], [], []
+        started = time.perf_counter()
+        for i in range(args.requests):
+            path, body = make(i)
+            start = time.perf_counter()
+            response = client.open(path, method=method, json=body, headers=HEADERS)
+            response.get_data()
+            latencies.append(time.perf_counter() - start)
+            statuses.append(response.status_code)
+            count = parse_queries(response.headers.get('Server-Timing'))
+            if count is not None:
+                queries.append(count)
+        results[endpoint] = summarize(latencies, queries, statuses, time.perf_counter() - started)
+        print_row(endpoint, results[endpoint])
+    return results
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def start_gunicorn(port):
+    command = ['gunicorn', '--chdir', SRC, '-w', str(args.workers), '-b', f'127.0.0.1:{port}',
+               '--log-level', 'warning'] + args.gunicorn_args.split() + ['wsgi']
+    process = subprocess.Popen(command, env=dict(os.environ, DATABASE_URL=DATABASE_URL), start_new_session=True)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            connection.request('GET', '/')
+            connection.getresponse().read()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    stop_gunicorn(process)
+    raise SystemExit("gunicorn did not start")
+
+def stop_gunicorn(process):
+    os.killpg(process.pid, signal.SIGTERM)
+    process.wait(timeout=30)
+
+def http_request(port, method, path, body):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    headers = dict(HEADERS)
+    payload = None
+    if body is not None:
+        payload = json.dumps(body)
+        headers['Content-Type'] = 'application/json'
+    start = time.perf_counter()
+    connection.request(method, path, body=payload, headers=headers)
+    response = connection.getresponse()
+    response.read()
+    elapsed = time.perf_counter() - start
+    connection.close()
+    return elapsed, response.status, parse_queries(response.getheader('Server-Timing'))
+
+def run_gunicorn(table):
+    port = free_port()
+    process = start_gunicorn(port)
+    results = {}
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            for endpoint, (method, make) in table.items():
+                requests = [make(i) for i in range(args.requests)]
+                started = time.perf_counter()
+                outcomes = list(executor.map(lambda request: http_request(port, method, *request), requests))
+                elapsed = time.perf_counter() - started
+                results[endpoint] = summarize(
+                    [outcome[0] for outcome in outcomes],
+                    [outcome[2] for outcome in outcomes if outcome[2] is not None],
+                    [outcome[1] for outcome in outcomes],
+                    elapsed)
+                print_row(endpoint, results[endpoint])
+    finally:
+        stop_gunicorn(process)
+    return results
+
+def print_header(mode):
+    print(f"\n== {mode} ==")
+    print(f"{'endpoint':34} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9} {'queries':>8}  status")
+
+def print_row(endpoint, result):
+    queries = '-' if result['queries_per_request'] is None else result['queries_per_request']
+    print(f"{endpoint:34} {result['p50_ms']:9.2f} {result['p95_ms']:9.2f} {result['p99_ms']:9.2f} "
+          f"{result['throughput_rps']:9.1f} {queries:>8}  {','.join(map(str, result['statuses']))}")
+
+def load_baselines(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+def compare(mode, results, baselines):
+    baseline = baselines.get(mode, {}).get('routes', {})
+    regressions = []
+    for endpoint, result in results.items():
+        before = baseline.get(endpoint)
+        if before is None:
+            continue
+        growth = result['p95_ms'] - before['p95_ms']
+        if growth > args.min_delta_ms and result['p95_ms'] > before['p95_ms'] * (1 + args.threshold):
+            regressions.append(f"{mode} {endpoint}: p95 {before['p95_ms']:.2f}ms -> {result['p95_ms']:.2f}ms")
+        if (before.get('queries_per_request') is not None and result['queries_per_request'] is not None
+                and result['queries_per_request'] > before['queries_per_request'] + 0.5):
+            regressions.append(f"{mode} {endpoint}: queries {before['queries_per_request']} -> {result['queries_per_request']}")
+    return regressions
+
+def report(mode, results):
+    return {
+        "mode": mode,
+        "config": {key: value for key, value in vars(args).items() if key not in ('baseline', 'save_baseline', 'output')},
+        "routes": results,
+    }
+
+def main():
+    seed()
+    modes = ('client', 'gunicorn') if args.mode == 'both' else (args.mode,)
+    baseline_path = args.baseline or os.path.join(BASELINES, 'baseline.json')
+    baselines = load_baselines(baseline_path)
+    regressions = []
+    reports = {}
+    for mode in modes:
+        if mode == 'gunicorn' and shutil.which('gunicorn') is None:
+            raise SystemExit("gunicorn is not installed")
+        # fresh rows for the DELETE routes on every run
+        table = routes()
+        check_coverage(table)
+        if args.routes:
+            table = {endpoint: table[endpoint] for endpoint in args.routes.split(',')}
+        print_header(mode)
+        results = run_client(table) if mode == 'client' else run_gunicorn(table)
+        reports[mode] = report(mode, results)
+        if not args.save_baseline:
+            regressions += compare(mode, results, baselines)
+    if args.save_baseline:
+        # keeps the baseline of the modes that were not run
+        os.makedirs(os.path.dirname(baseline_path), exist_ok=True)
+        with open(baseline_path, 'w') as file:
+            json.dump(dict(baselines, **reports), file, indent=2, sort_keys=True)
+        print(f"\nbaseline saved to {baseline_path}")
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(reports, file, indent=2, sort_keys=True)
+    os.remove(DB_PATH)
+    if regressions:
+        print("\nRegressions over the baseline:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Import time and cold start of the app, and start up of the flask CLI.
+
+Every scenario runs --runs times in a fresh interpreter (nothing is cached
+between runs) against a temporary sqlite database, and reports the median
+and the best run:
+
+    import app          `import wsgi`, what a gunicorn worker does before serving
+    first request       import plus the first GET /people on the test client
+    flask db --help     the CLI loading the app and the migration commands, the
+                        start up part of `flask db upgrade` in the release phase
+    flask routes        any other CLI command
+
+each with the default config (admin enabled) and with ENABLE_ADMIN=false.
+
+    $ python benchmarks/startup.py --runs 10
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+SRC = os.path.join(ROOT, 'src')
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument('--runs', type=int, default=10)
+args = parser.parse_args()
+
+IMPORT = "import time; t = time.perf_counter(); import wsgi; print(time.perf_counter() - t)"
+FIRST_REQUEST = (
+    "import time; t = time.perf_counter(); import wsgi; "
+    "assert wsgi.application.test_client().get('/people').status_code == 200; "
+    "print(time.perf_counter() - t)")
+SCENARIOS = (
+    ("import app", [sys.executable, '-c', IMPORT]),
+    ("first request", [sys.executable, '-c', FIRST_REQUEST]),
+    ("flask db --help", [sys.executable, '-m', 'flask', 'db', '--help']),
+    ("flask routes", [sys.executable, '-m', 'flask', 'routes']),
+)
+CONFIGS = (
+    ("default", {}),
+    ("ENABLE_ADMIN=false", {"ENABLE_ADMIN": "false"}),
+)
+
+def run(command, env):
+    # seconds measured inside the interpreter for the python snippets, wall
+    # clock of the whole process for the CLI commands
+    start = time.perf_counter()
+    result = subprocess.run(command, cwd=SRC, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        sys.exit(f"{' '.join(command)} failed:\n{result.stderr}")
+    if command[1] == '-c':
+        return float(result.stdout.strip().splitlines()[-1])
+    return elapsed
+
+def main():
+    fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    base_env = dict(os.environ, DATABASE_URL=f'sqlite:///{db_path}', FLASK_APP='app.py',
+                    METRICS_DIR=tempfile.mkdtemp())
+    setup = ("from app import app; from models import db; ctx = app.app_context(); ctx.push(); db.create_all()")
+    subprocess.run([sys.executable, '-c', setup], cwd=SRC, env=base_env, check=True)
+
+    print(f"{'scenario':18} {'config':20} {'median ms':>10} {'best ms':>9}")
+    for name, command in SCENARIOS:
+        for config, extra in CONFIGS:
+            env = dict(base_env, **extra)
+            run(command, env)  # warm the bytecode and the OS file cache
+            times = [run(command, env) for _ in range(args.runs)]
+            print(f"{name:18} {config:20} {statistics.median(times) * 1000:10.0f} {min(times) * 1000:9.0f}")
+    os.remove(db_path)
+
+if __name__ == '__main__':
+    main()
@@ -80,6 +80,13 @@ def run_migrations_online():
     connectable = current_app.extensions['migrate'].db.get_engine()
 
     with connectable.connect() as connection:
+        if connection.dialect.name == 'sqlite':
+            # batch migrations copy and drop tables, with foreign keys enforced
+            # dropping a table would cascade to (or fail on) the rows referencing it
+            connection.exec_driver_sql("PRAGMA foreign_keys=OFF")
+            # the PRAGMA autobegins a transaction that begin_transaction() would
+            # join without ever committing, so close it before configuring
+            connection.commit()
         context.configure(
             connection=connection,
             target_metadata=get_metadata(),
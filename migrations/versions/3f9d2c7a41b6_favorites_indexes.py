@@ -0,0 +1,42 @@
+"""unique (user, item) indexes and reverse indexes on the favorite_* tables
+
+Revision ID: 3f9d2c7a41b6
+Revises: 24c25e107a1b
+Create Date: 2026-10-18 11:45:12.402815
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9d2c7a41b6'
+down_revision = '24c25e107a1b'
+branch_labels = None
+depends_on = None
+
+
+FAVORITE_TABLES = (
+    ('favorite_characters', 'character_id'),
+    ('favorite_vehicles', 'vehicle_id'),
+    ('favorite_planets', 'planet_id'),
+)
+
+
+def upgrade():
+    for table, target in FAVORITE_TABLES:
+        # Remove the duplicated (user, item) pairs that were inserted before the
+        # unique index existed, keeping the oldest row of each pair
+        op.execute(
+            f"DELETE FROM {table} WHERE id NOT IN "
+            f"(SELECT min_id FROM (SELECT MIN(id) AS min_id FROM {table} GROUP BY user_id, {target}) AS keep)")
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.create_index(f'ix_{table}_user_id_{target}', ['user_id', target], unique=True)
+            batch_op.create_index(f'ix_{table}_{target}', [target], unique=False)
+
+
+def downgrade():
+    for table, target in FAVORITE_TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(f'ix_{table}_{target}')
+            batch_op.drop_index(f'ix_{table}_user_id_{target}')
@@ -0,0 +1,31 @@
+"""table_version counters used for ETags
+
+Revision ID: 8c41e0b7d2a9
+Revises: 3f9d2c7a41b6
+Create Date: 2026-10-18 12:02:37.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c41e0b7d2a9'
+down_revision = '3f9d2c7a41b6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    table_version = op.create_table('table_version',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.bulk_insert(table_version, [
+        {'name': name, 'version': 0} for name in ('user', 'character', 'planets', 'vehicle')
+    ])
+
+
+def downgrade():
+    op.drop_table('table_version')
@@ -0,0 +1,45 @@
+"""sqlite search update triggers only fire for the searched columns
+
+Revision ID: a9e4d2b7c6f3
+Revises: f3a9c1d7e5b2
+Create Date: 2026-10-18 19:41:08.263514
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9e4d2b7c6f3'
+down_revision = 'f3a9c1d7e5b2'
+branch_labels = None
+depends_on = None
+
+
+# table: (code, searchable text, {row} is the trigger row prefix, columns it is built from)
+DOCUMENTS = {
+    'character': (1, "{row}first_name || ' ' || coalesce({row}last_name, '') || ' ' || {row}specie",
+                  ('id', 'first_name', 'last_name', 'specie')),
+    'planets': (2, "{row}name || ' ' || coalesce({row}climate, '')", ('id', 'name', 'climate')),
+    'vehicle': (3, "{row}name", ('id', 'name')),
+}
+
+
+def create_update_triggers(scoped):
+    for table, (code, body, columns) in DOCUMENTS.items():
+        delete = f"DELETE FROM search_index WHERE rowid = old.id * 4 + {code};"
+        insert = f"INSERT INTO search_index(rowid, body) VALUES (new.id * 4 + {code}, {body.format(row='new.')});"
+        of = f" OF {', '.join(columns)}" if scoped else ""
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_search_update")
+        op.execute(f"CREATE TRIGGER {table}_search_update AFTER UPDATE{of} ON {table} BEGIN {delete} {insert} END")
+
+
+def upgrade():
+    # a favorite_count bump rewrote the row's FTS document, postgres has no triggers
+    if op.get_bind().dialect.name == 'sqlite':
+        create_update_triggers(scoped=True)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        create_update_triggers(scoped=False)
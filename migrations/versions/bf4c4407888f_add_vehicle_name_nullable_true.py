@@ -23,7 +23,7 @@ def upgrade():
         batch_op.alter_column('driver_id',
                existing_type=sa.INTEGER(),
                nullable=True)
-        batch_op.create_unique_constraint(None, ['name'])
+        batch_op.create_unique_constraint('vehicle_name_key', ['name'])
 
     # ### end Alembic commands ###
 
@@ -31,7 +31,7 @@ def upgrade():
 def downgrade():
     # ### commands auto generated by Alembic - please adjust! ###
     with op.batch_alter_table('vehicle', schema=None) as batch_op:
-        batch_op.drop_constraint(None, type_='unique')
+        batch_op.drop_constraint('vehicle_name_key', type_='unique')
         batch_op.alter_column('driver_id',
                existing_type=sa.INTEGER(),
                nullable=False)
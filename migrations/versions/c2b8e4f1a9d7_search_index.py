@@ -0,0 +1,52 @@
+"""full text search index: FTS5 table + triggers on sqlite, GIN tsvector indexes on postgres
+
+Revision ID: c2b8e4f1a9d7
+Revises: c7e19a3d5f02
+Create Date: 2026-10-18 13:52:08.530112
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2b8e4f1a9d7'
+down_revision = 'c7e19a3d5f02'
+branch_labels = None
+depends_on = None
+
+
+# table: (code, searchable text, {row} is the trigger row prefix)
+DOCUMENTS = {
+    'character': (1, "{row}first_name || ' ' || coalesce({row}last_name, '') || ' ' || {row}specie"),
+    'planets': (2, "{row}name || ' ' || coalesce({row}climate, '')"),
+    'vehicle': (3, "{row}name"),
+}
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE search_index USING fts5(body, tokenize='unicode61 remove_diacritics 2')")
+        for table, (code, body) in DOCUMENTS.items():
+            insert = f"INSERT INTO search_index(rowid, body) VALUES (new.id * 4 + {code}, {body.format(row='new.')});"
+            delete = f"DELETE FROM search_index WHERE rowid = old.id * 4 + {code};"
+            op.execute(f"CREATE TRIGGER {table}_search_insert AFTER INSERT ON {table} BEGIN {insert} END")
+            op.execute(f"CREATE TRIGGER {table}_search_update AFTER UPDATE ON {table} BEGIN {delete} {insert} END")
+            op.execute(f"CREATE TRIGGER {table}_search_delete AFTER DELETE ON {table} BEGIN {delete} END")
+            op.execute(f"INSERT INTO search_index(rowid, body) SELECT id * 4 + {code}, {body.format(row='')} FROM {table}")
+    elif dialect == 'postgresql':
+        for table, (code, body) in DOCUMENTS.items():
+            op.execute(f"CREATE INDEX ix_{table}_search ON \"{table}\" USING gin (to_tsvector('simple', {body.format(row='')}))")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for table in DOCUMENTS:
+            for event in ('insert', 'update', 'delete'):
+                op.execute(f"DROP TRIGGER {table}_search_{event}")
+        op.execute("DROP TABLE search_index")
+    elif dialect == 'postgresql':
+        for table in DOCUMENTS:
+            op.execute(f"DROP INDEX ix_{table}_search")
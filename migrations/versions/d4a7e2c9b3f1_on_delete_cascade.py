@@ -0,0 +1,59 @@
+"""ON DELETE CASCADE on the favorite_* foreign keys, ON DELETE SET NULL on vehicle.driver_id
+
+Revision ID: d4a7e2c9b3f1
+Revises: c2b8e4f1a9d7
+Create Date: 2026-10-18 16:21:37.904113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4a7e2c9b3f1'
+down_revision = 'c2b8e4f1a9d7'
+branch_labels = None
+depends_on = None
+
+
+# table: [(column, referred table, ondelete)]
+FOREIGN_KEYS = {
+    'favorite_characters': [('user_id', 'user', 'CASCADE'), ('character_id', 'character', 'CASCADE')],
+    'favorite_vehicles': [('user_id', 'user', 'CASCADE'), ('vehicle_id', 'vehicle', 'CASCADE')],
+    'favorite_planets': [('user_id', 'user', 'CASCADE'), ('planet_id', 'planets', 'CASCADE')],
+    'vehicle': [('driver_id', 'character', 'SET NULL')],
+}
+
+# names the unnamed sqlite foreign keys like postgres does, so batch mode can drop them
+NAMING_CONVENTION = {"fk": "%(table_name)s_%(column_0_name)s_fkey"}
+
+# recreating vehicle on sqlite drops its full text search triggers (see c2b8e4f1a9d7)
+VEHICLE_SEARCH_TRIGGERS = (
+    "CREATE TRIGGER IF NOT EXISTS vehicle_search_insert AFTER INSERT ON vehicle BEGIN "
+    "INSERT INTO search_index(rowid, body) VALUES (new.id * 4 + 3, new.name); END",
+    "CREATE TRIGGER IF NOT EXISTS vehicle_search_update AFTER UPDATE ON vehicle BEGIN "
+    "DELETE FROM search_index WHERE rowid = old.id * 4 + 3; "
+    "INSERT INTO search_index(rowid, body) VALUES (new.id * 4 + 3, new.name); END",
+    "CREATE TRIGGER IF NOT EXISTS vehicle_search_delete AFTER DELETE ON vehicle BEGIN "
+    "DELETE FROM search_index WHERE rowid = old.id * 4 + 3; END",
+)
+
+
+def set_ondelete(cascade):
+    for table, foreign_keys in FOREIGN_KEYS.items():
+        with op.batch_alter_table(table, schema=None, naming_convention=NAMING_CONVENTION) as batch_op:
+            for column, referred, ondelete in foreign_keys:
+                name = f'{table}_{column}_fkey'
+                batch_op.drop_constraint(name, type_='foreignkey')
+                batch_op.create_foreign_key(name, referred, [column], ['id'], ondelete=ondelete if cascade else None)
+    if op.get_bind().dialect.name == 'sqlite':
+        for statement in VEHICLE_SEARCH_TRIGGERS:
+            op.execute(statement)
+
+
+def upgrade():
+    set_ondelete(True)
+
+
+def downgrade():
+    set_ondelete(False)
@@ -0,0 +1,40 @@
+"""favorite_count on character, planets and vehicle, with a (favorite_count, id) index
+
+Revision ID: e8b3c6f2a1d4
+Revises: d4a7e2c9b3f1
+Create Date: 2026-10-18 17:05:52.118640
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8b3c6f2a1d4'
+down_revision = 'd4a7e2c9b3f1'
+branch_labels = None
+depends_on = None
+
+
+# table: (favorite table, its column referencing the table)
+COUNTED = {
+    'character': ('favorite_characters', 'character_id'),
+    'planets': ('favorite_planets', 'planet_id'),
+    'vehicle': ('favorite_vehicles', 'vehicle_id'),
+}
+
+
+def upgrade():
+    # plain ALTER TABLE instead of batch mode, a sqlite table copy would drop the search triggers
+    for table, (favorites, column) in COUNTED.items():
+        op.add_column(table, sa.Column('favorite_count', sa.Integer(), server_default='0', nullable=False))
+        op.execute(
+            f"UPDATE \"{table}\" SET favorite_count = "
+            f"(SELECT COUNT(*) FROM {favorites} WHERE {favorites}.{column} = \"{table}\".id)")
+        op.create_index(f'ix_{table}_favorite_count_id', table, ['favorite_count', 'id'], unique=False)
+
+
+def downgrade():
+    for table in COUNTED:
+        op.drop_index(f'ix_{table}_favorite_count_id', table_name=table)
+        op.drop_column(table, 'favorite_count')
@@ -0,0 +1,42 @@
+"""text_pattern_ops indexes for the prefix filters, postgres only
+
+Revision ID: f3a9c1d7e5b2
+Revises: e8b3c6f2a1d4
+Create Date: 2026-10-18 19:02:37.415820
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a9c1d7e5b2'
+down_revision = 'e8b3c6f2a1d4'
+branch_labels = None
+depends_on = None
+
+
+# (table, column) of the ?<column>__prefix= filters
+PATTERN_COLUMNS = [
+    ('user', 'email'),
+    ('character', 'specie'),
+    ('planets', 'name'),
+    ('planets', 'climate'),
+    ('vehicle', 'name'),
+]
+
+
+def upgrade():
+    # sqlite answers the prefixes with a range on the plain indexes
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table, column in PATTERN_COLUMNS:
+        op.create_index(f'ix_{table}_{column}_pattern', table, [column], unique=False,
+                        postgresql_ops={column: 'text_pattern_ops'})
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table, column in PATTERN_COLUMNS:
+        op.drop_index(f'ix_{table}_{column}_pattern', table_name=table)
@@ -1,35 +1,165 @@
 import os
+from flask import g
 from flask_admin import Admin
+from sqlalchemy import func, select, text, literal
+from sqlalchemy.orm import selectinload
 from models import db, User, Characters, FavoriteCharacters, Vehicle, FavoriteVehicles, FavoritePlanets, Planets
 from flask_admin.contrib.sqla import ModelView
+from cache import invalidate
+from favorites import change_favorite_count, forget_user_favorites
+from versioning import bump_version
 
-class UserModelView(ModelView):
+# below this many rows (estimated) the list pages show the exact count
+ADMIN_EXACT_COUNT_LIMIT = int(os.environ.get('ADMIN_EXACT_COUNT_LIMIT', 10000))
+
+def estimated_count(model):
+    # O(1) row count estimate: the planner statistics on postgres, the highest
+    # rowid on sqlite (deleted rows are still counted). None when unknown.
+    table = model.__tablename__
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        estimate = db.session.execute(
+            text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table)"), {"table": f'"{table}"'}).scalar()
+        return estimate if estimate is not None and estimate >= 0 else None
+    if dialect == 'sqlite':
+        return db.session.execute(select(func.max(model.id))).scalar() or 0
+    return None
+
+def count_formatter(view, context, model, name):
+    return view.relationship_counts.get(name, {}).get(model.id, 0)
+
+class ScalableModelView(ModelView):
+    # List pages render one page of rows with a fixed number of queries:
+    #   count_columns     to-many relationships shown as their size, counted with
+    #                     one GROUP BY per column for the whole page
+    #   eager_columns     relationships of the list loaded with selectinload
+    #   the many-to-one columns are joined by column_auto_select_related
+    # and without search or filters the pager uses an estimated count.
     column_auto_select_related = True
+    count_columns = {}
+    eager_columns = ()
+
+    def __init__(self, *args, **kwargs):
+        self.column_formatters = dict(self.column_formatters or {}, **{name: count_formatter for name in self.count_columns})
+        super().__init__(*args, **kwargs)
+
+    @property
+    def relationship_counts(self):
+        return g.get('admin_relationship_counts', {})
+
+    def get_query(self):
+        query = super().get_query()
+        for name in self.eager_columns:
+            query = query.options(selectinload(getattr(self.model, name)))
+        return query
+
+    def get_count_query(self):
+        if g.get('admin_estimate_count'):
+            estimate = estimated_count(self.model)
+            if estimate is not None and estimate >= ADMIN_EXACT_COUNT_LIMIT:
+                return self.session.query(literal(estimate))
+        return super().get_count_query()
+
+    def get_list(self, page, sort_column, sort_desc, search, filters, execute=True, page_size=None):
+        g.admin_estimate_count = not search and not filters
+        count, rows = super().get_list(page, sort_column, sort_desc, search, filters, execute, page_size)
+        if execute and self.count_columns:
+            ids = [row.id for row in rows]
+            counts = {}
+            for name, column in self.count_columns.items():
+                counts[name] = dict(self.session.execute(
+                    select(column, func.count()).where(column.in_(ids)).group_by(column)).all())
+            g.admin_relationship_counts = counts
+        return count, rows
+
+class UserModelView(ScalableModelView):
     column_list = ('id', 'user_name', 'email', 'is_active', 'favoritecha', 'favoriteveh', 'favoritepla')
+    count_columns = {
+        'favoritecha': FavoriteCharacters.user_id,
+        'favoriteveh': FavoriteVehicles.user_id,
+        'favoritepla': FavoritePlanets.user_id,
+    }
+    form_excluded_columns = ('favoritecha', 'favoriteveh', 'favoritepla')
 
-class CharacterModelView(ModelView):
-    column_auto_select_related = True
-    column_list = ('id', 'first_name', 'last_name', 'specie', 'height', 'favorite_by', 'vehicle')
+    def on_model_delete(self, model):
+        forget_user_favorites(model.id)
 
-class FavoriteCharacterModelView(ModelView):
-    column_auto_select_related = True
+class CharacterModelView(ScalableModelView):
+    column_list = ('id', 'first_name', 'last_name', 'specie', 'height', 'favorite_count', 'vehicle')
+    eager_columns = ('vehicle',)
+    form_excluded_columns = ('favorite_by', 'favorite_count')
+    form_ajax_refs = {
+        'vehicle': {'fields': ('name',), 'page_size': 10},
+    }
+
+    def on_model_delete(self, model):
+        # ON DELETE SET NULL clears the driver of its vehicle in the database, outside of the flush
+        bump_version(Vehicle)
+
+    def after_model_delete(self, model):
+        invalidate(Vehicle)
+
+class FavoriteModelView(ScalableModelView):
+    # Moves the favorite_count of the target with the favorite, like the API
+    # handlers do. target_column is the foreign key to the target model.
+    target = None
+    target_column = None
+
+    def update_model(self, form, model):
+        # the target before the form changes it
+        g.admin_favorite_target = getattr(model, self.target_column)
+        return super().update_model(form, model)
+
+    def on_model_change(self, form, model, is_created):
+        # a duplicate fails at flush, before the count moves
+        self.session.flush()
+        target_id = getattr(model, self.target_column)
+        previous = None if is_created else g.pop('admin_favorite_target', None)
+        if previous != target_id:
+            if previous is not None:
+                change_favorite_count(self.target, previous, -1)
+            change_favorite_count(self.target, target_id, 1)
+
+    def on_model_delete(self, model):
+        change_favorite_count(self.target, getattr(model, self.target_column), -1)
+
+class FavoriteCharacterModelView(FavoriteModelView):
+    target = Characters
+    target_column = 'character_id'
     column_list = ('id', 'user', 'character')
+    form_ajax_refs = {
+        'user': {'fields': ('user_name', 'email'), 'page_size': 10},
+        'character': {'fields': ('first_name', 'last_name'), 'page_size': 10},
+    }
 
-class VehicleModelView(ModelView):
-    column_auto_select_related = True
-    column_list = ('id', 'name', 'max_speed', 'driver', 'favorite_by')
+class VehicleModelView(ScalableModelView):
+    column_list = ('id', 'name', 'max_speed', 'driver', 'favorite_count')
+    form_excluded_columns = ('favorite_by', 'favorite_count')
+    form_ajax_refs = {
+        'driver': {'fields': ('first_name', 'last_name'), 'page_size': 10},
+    }
 
-class FavoriteVehicleModelView(ModelView):
-    column_auto_select_related = True
+class FavoriteVehicleModelView(FavoriteModelView):
+    target = Vehicle
+    target_column = 'vehicle_id'
     column_list = ('id', 'user', 'vehicle')
+    form_ajax_refs = {
+        'user': {'fields': ('user_name', 'email'), 'page_size': 10},
+        'vehicle': {'fields': ('name',), 'page_size': 10},
+    }
 
-class PlanetModelView(ModelView):
-    column_auto_select_related = True
-    column_list = ('id', 'name', 'population', 'climate', 'favorite_by')
+class PlanetModelView(ScalableModelView):
+    column_list = ('id', 'name', 'population', 'climate', 'favorite_count')
+    form_excluded_columns = ('favorite_by', 'favorite_count')
 
-class FavoritePlanetModelView(ModelView):
-    column_auto_select_related = True
+class FavoritePlanetModelView(FavoriteModelView):
+    target = Planets
+    target_column = 'planet_id'
     column_list = ('id', 'user', 'planet')
+    form_ajax_refs = {
+        'user': {'fields': ('user_name', 'email'), 'page_size': 10},
+        'planet': {'fields': ('name',), 'page_size': 10},
+    }
 
 def setup_admin(app):
     app.secret_key = os.environ.get('FLASK_APP_KEY', 'sample key')
@@ -2,56 +2,125 @@
 This module takes care of starting the API Server, Loading the DB and Adding the endpoints
 """
 import os
-from flask import Flask, request, jsonify, url_for
-from flask_migrate import Migrate
-from flask_swagger import swagger
+from flask import Flask, Blueprint, request, jsonify, url_for, Response, stream_with_context, current_app
 from flask_cors import CORS
-from utils import APIException, generate_sitemap
-from admin import setup_admin
-from models import db, User, Characters, Planets, Vehicle, FavoriteCharacters, FavoritePlanets, FavoriteVehicles
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+from utils import APIException, generate_sitemap, bulk_insert, internal
+from listing import paginate, get_fields_arg, get_limit, encode_cursor, decode_cursor
+from search import search
+from batch import run_batch
+from favorites import set_favorites, change_favorite_count, forget_user_favorites, favorite_conflict
+from versioning import conditional, bump_version
+from serializers import serialize_fields, select_fields, dumps, json_response
+from cache import get_entity, invalidate, entity_cache
+from validators import validate_character, validate_planet, validate_vehicle, character_values, planet_values, vehicle_values
+from commands import setup_commands
+from dbpool import engine_options, pool_status, env_flag
+from metrics import setup_metrics, render as render_metrics
+from replica import setup_replica, replica_url, REPLICA, READ_YOUR_WRITES_HEADER
+from compression import setup_compression
+from models import db, enable_sqlite_foreign_keys, User, Characters, Planets, Vehicle, FavoriteCharacters, FavoritePlanets, FavoriteVehicles
 #from models import Person
 
-app = Flask(__name__)
-app.url_map.strict_slashes = False
-
-db_url = os.getenv("DATABASE_URL")
-if db_url is not None:
-    app.config['SQLALCHEMY_DATABASE_URI'] = db_url.replace("postgres://", "postgresql://")
-else:
-    app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-MIGRATE = Migrate(app, db)
-db.init_app(app)
-CORS(app)
-setup_admin(app)
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 1000))
+EXPORTS = {
+    'people': Characters,
+    'planets': Planets,
+    'vehicles': Vehicle,
+    'favorite_people': FavoriteCharacters,
+    'favorite_planets': FavoritePlanets,
+    'favorite_vehicles': FavoriteVehicles,
+}
+POPULAR = {
+    'people': Characters,
+    'planets': Planets,
+    'vehicles': Vehicle,
+}
+
+api = Blueprint('api', __name__)
+
+def create_app(config=None):
+    app = Flask(__name__)
+    app.url_map.strict_slashes = False
+
+    db_url = os.getenv("DATABASE_URL")
+    if db_url is not None:
+        app.config['SQLALCHEMY_DATABASE_URI'] = db_url.replace("postgres://", "postgresql://")
+    else:
+        app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # flask-admin (/admin) and the swagger spec (/swagger.json) are only
+    # imported and registered when enabled
+    app.config['ENABLE_ADMIN'] = env_flag('ENABLE_ADMIN', True)
+    app.config['ENABLE_SWAGGER'] = env_flag('ENABLE_SWAGGER', False)
+    # bearer token of /_internal/* and /metrics, which are 404 without it
+    app.config['INTERNAL_TOKEN'] = os.environ.get('INTERNAL_TOKEN')
+    app.config.update(config or {})
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config['SQLALCHEMY_DATABASE_URI']))
+    read_url = replica_url()
+    if read_url is not None:
+        app.config.setdefault('SQLALCHEMY_BINDS', {REPLICA: dict(engine_options(read_url), url=read_url)})
+
+    setup_commands(app)
+    db.init_app(app)
+    with app.app_context():
+        for engine in db.engines.values():
+            enable_sqlite_foreign_keys(engine)
+    # cross-origin clients read the header to stay on the primary after a write (see replica.py)
+    CORS(app, expose_headers=[READ_YOUR_WRITES_HEADER])
+    setup_metrics(app)
+    setup_replica(app)
+    # after the metrics hook, so the request time includes the compression
+    setup_compression(app)
+    app.register_blueprint(api)
+    if app.config['ENABLE_ADMIN']:
+        from admin import setup_admin
+        setup_admin(app)
+    if app.config['ENABLE_SWAGGER']:
+        from flask_swagger import swagger
+        app.add_url_rule('/swagger.json', 'swagger', lambda: jsonify(swagger(app)))
+    return app
 
 # Handle/serialize errors like a JSON object
-@app.errorhandler(APIException)
+@api.app_errorhandler(APIException)
 def handle_invalid_usage(error):
     return jsonify(error.to_dict()), error.status_code
 
 # generate sitemap with all your endpoints
-@app.route('/')
+@api.route('/')
 def sitemap():
-    return generate_sitemap(app)
+    return generate_sitemap(current_app)
+
+@api.route('/_internal/cache', methods=['GET'])
+@internal
+def get_cache_stats():
+    return jsonify(entity_cache.stats()), 200
+
+@api.route('/_internal/pool', methods=['GET'])
+@internal
+def get_pool_stats():
+    # one entry per bind: the primary and, when configured, the replica
+    return jsonify({bind or 'primary': pool_status(engine) for bind, engine in db.engines.items()}), 200
 
-@app.route('/users', methods=['GET'])
+@api.route('/metrics', methods=['GET'])
+@internal
+def get_metrics():
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@api.route('/users', methods=['GET'])
 def get_users():
-    users = User.query.all()
-    users_serialized=[]
-    for user in users:
-        users_serialized.append(user.serialize())
-    return jsonify({'data': users_serialized})
+    users, next_cursor = paginate(User)
+    return json_response({'data': users, 'next': next_cursor})
 
-@app.route('/users/<int:user_id>', methods=['GET'])
+@api.route('/users/<int:user_id>', methods=['GET'])
 def get_user_id(user_id):
-    user= User.query.get(user_id)
+    user= get_entity(User, user_id, get_fields_arg(User))
     if user is None:
         return jsonify({"msg":"User no existe"}), 404
-    return jsonify(user.serialize()), 200
+    return json_response(user)
 
-@app.route('/users', methods=['POST'])
+@api.route('/users', methods=['POST'])
 def add_user():
     body=request.get_json(silent=True)
     if body is None:
@@ -67,7 +136,7 @@ def add_user():
     db.session.commit()
     return jsonify(new_user.serialize()), 201
 
-@app.route('/users/<int:user_id>', methods=['PUT'])
+@api.route('/users/<int:user_id>', methods=['PUT'])
 def update_user(user_id):
     user= User.query.get(user_id)
     if user is None:
@@ -84,49 +153,51 @@ def update_user(user_id):
     db.session.commit()
     return jsonify(user.serialize()), 200
 
-@app.route('/users/<int:user_id>', methods=['DELETE'])
+@api.route('/users/<int:user_id>', methods=['DELETE'])
 def delete_user(user_id):
     user= User.query.get(user_id)
     if user is None:
         return jsonify({"msg":"User no existe"}), 404
+    forget_user_favorites(user_id)
     db.session.delete(user)
     db.session.commit()
     return jsonify({"msg":"User eliminado"}), 200
 
-@app.route('/people', methods=['GET'])
+@api.route('/people', methods=['GET'])
+@conditional(Characters)
 def get_characters():
-    characters = Characters.query.all()
-    characters_serialized=[]
-    for character in characters:
-        characters_serialized.append(character.serialize())
-    return jsonify({'data': characters_serialized})
+    characters, next_cursor = paginate(Characters)
+    return json_response({'data': characters, 'next': next_cursor})
 
-@app.route('/people/<int:character_id>', methods=['GET'])
+@api.route('/people/<int:character_id>', methods=['GET'])
+@conditional(Characters)
 def get_character_id(character_id):
-    character= Characters.query.get(character_id)
+    character= get_entity(Characters, character_id, get_fields_arg(Characters))
     if character is None:
         return jsonify({"msg":"Personaje no existe"}), 404
-    return jsonify(character.serialize()), 200
+    return json_response(character)
 
-@app.route('/people', methods=['POST'])
+@api.route('/people', methods=['POST'])
 def add_character():
     body=request.get_json(silent=True)
     if body is None:
         return jsonify({"msg":"El body no puede estar vacio"}), 400
-    if 'first_name' not in body:
-        return jsonify({"msg":"El nombre es necesario"}), 400
-    if 'specie' not in body:
-        return jsonify({"msg":"La especie es necesaria"}), 400
-    new_character=Characters()
-    new_character.first_name=body['first_name']
-    new_character.last_name=body.get('last_name')
-    new_character.specie=body['specie']
-    new_character.height=body.get('height')
+    error=validate_character(body)
+    if error is not None:
+        return jsonify({"msg":error}), 400
+    new_character=Characters(**character_values(body))
     db.session.add(new_character)
     db.session.commit()
     return jsonify(new_character.serialize()), 201
 
-@app.route('/people/<int:character_id>', methods=['PUT'])
+@api.route('/people/bulk', methods=['POST'])
+def add_characters_bulk():
+    body=request.get_json(silent=True)
+    if not isinstance(body, list):
+        return jsonify({"msg":"El body debe ser una lista"}), 400
+    return bulk_insert(Characters, body, validate_character, character_values)
+
+@api.route('/people/<int:character_id>', methods=['PUT'])
 def update_character(character_id):
     character= Characters.query.get(character_id)
     if character is None:
@@ -145,46 +216,53 @@ def update_character(character_id):
     db.session.commit()
     return jsonify(character.serialize()), 200
 
-@app.route('/people/<int:character_id>', methods=['DELETE'])
+@api.route('/people/<int:character_id>', methods=['DELETE'])
 def delete_character(character_id):
     character= Characters.query.get(character_id)
     if character is None:
         return jsonify({"msg":"Personaje no existe"}), 404
     db.session.delete(character)
+    # ON DELETE SET NULL clears the driver of its vehicle in the database, outside of the flush
+    bump_version(Vehicle)
     db.session.commit()
+    invalidate(Vehicle)
     return jsonify({"msg":"Personaje eliminado"}), 200
 
-@app.route('/planets', methods=['GET'])
+@api.route('/planets', methods=['GET'])
+@conditional(Planets)
 def get_planets():
-    planets= Planets.query.all()
-    planets_serialized=[]
-    for planet in planets:
-        planets_serialized.append(planet.serialize())
-    return jsonify({'data':planets_serialized})
+    planets, next_cursor = paginate(Planets)
+    return json_response({'data': planets, 'next': next_cursor})
 
-@app.route('/planets/<int:planet_id>', methods=['GET'])
+@api.route('/planets/<int:planet_id>', methods=['GET'])
+@conditional(Planets)
 def get_planets_id(planet_id):
-    planet= Planets.query.get(planet_id)
+    planet= get_entity(Planets, planet_id, get_fields_arg(Planets))
     if planet is None:
         return jsonify({'msg': "Planeta no existe"}), 404
-    return jsonify(planet.serialize()), 200
+    return json_response(planet)
 
-@app.route('/planets', methods=['POST'])
+@api.route('/planets', methods=['POST'])
 def add_planet():
     body=request.get_json(silent=True)
     if body is None:
         return jsonify({"msg":"El body no puede estar vacio"}), 400
-    if 'name' not in body:
-        return jsonify({"msg":"El nombre es necesario"}), 400
-    new_planet=Planets()
-    new_planet.name=body['name']
-    new_planet.population=body.get('population')
-    new_planet.climate=body.get('climate')
+    error=validate_planet(body)
+    if error is not None:
+        return jsonify({"msg":error}), 400
+    new_planet=Planets(**planet_values(body))
     db.session.add(new_planet)
     db.session.commit()
     return jsonify(new_planet.serialize()), 201
 
-@app.route('/planets/<int:planet_id>', methods=['PUT'])
+@api.route('/planets/bulk', methods=['POST'])
+def add_planets_bulk():
+    body=request.get_json(silent=True)
+    if not isinstance(body, list):
+        return jsonify({"msg":"El body debe ser una lista"}), 400
+    return bulk_insert(Planets, body, validate_planet, planet_values)
+
+@api.route('/planets/<int:planet_id>', methods=['PUT'])
 def update_planet(planet_id):
     planet= Planets.query.get(planet_id)
     if planet is None:
@@ -201,7 +279,7 @@ def update_planet(planet_id):
     db.session.commit()
     return jsonify(planet.serialize()), 200
 
-@app.route('/planets/<int:planet_id>', methods=['DELETE'])
+@api.route('/planets/<int:planet_id>', methods=['DELETE'])
 def delete_planet(planet_id):
     planet= Planets.query.get(planet_id)
     if planet is None:
@@ -210,36 +288,41 @@ def delete_planet(planet_id):
     db.session.commit()
     return jsonify({"msg":"Planeta eliminado"}), 200
 
-@app.route('/vehicles', methods=['GET'])
+@api.route('/vehicles', methods=['GET'])
+@conditional(Vehicle)
 def get_vehicles():
-    vehicles=Vehicle.query.all()
-    vehicles_serialized=[]
-    for vehicle in vehicles:
-        vehicles_serialized.append(vehicle.serialize())
-    return jsonify({'data':vehicles_serialized})
+    vehicles, next_cursor = paginate(Vehicle)
+    return json_response({'data': vehicles, 'next': next_cursor})
 
-@app.route('/vehicles/<int:vehicles_id>', methods=['GET'])
+@api.route('/vehicles/<int:vehicles_id>', methods=['GET'])
+@conditional(Vehicle)
 def get_vehicles_id(vehicles_id):
-    vehicle= Vehicle.query.get(vehicles_id)
+    vehicle= get_entity(Vehicle, vehicles_id, get_fields_arg(Vehicle))
     if vehicle is None:
         return jsonify ({'msg': "Vehiculo no existe"}), 400
-    return jsonify(vehicle.serialize()), 200
+    return json_response(vehicle)
 
-@app.route('/vehicles', methods=['POST'])
+@api.route('/vehicles', methods=['POST'])
 def add_vehicle():
     body=request.get_json(silent=True)
     if body is None:
         return jsonify({"msg":"El body no puede estar vacio"}), 400
-    if 'name' not in body:
-        return jsonify({"msg":"El nombre es necesario"}), 400
-    new_vehicle=Vehicle()
-    new_vehicle.name=body['name']
-    new_vehicle.max_speed=body.get('max_speed')
+    error=validate_vehicle(body)
+    if error is not None:
+        return jsonify({"msg":error}), 400
+    new_vehicle=Vehicle(**vehicle_values(body))
     db.session.add(new_vehicle)
     db.session.commit()
     return jsonify(new_vehicle.serialize()), 201
 
-@app.route('/vehicles/<int:vehicle_id>', methods=['PUT'])
+@api.route('/vehicles/bulk', methods=['POST'])
+def add_vehicles_bulk():
+    body=request.get_json(silent=True)
+    if not isinstance(body, list):
+        return jsonify({"msg":"El body debe ser una lista"}), 400
+    return bulk_insert(Vehicle, body, validate_vehicle, vehicle_values)
+
+@api.route('/vehicles/<int:vehicle_id>', methods=['PUT'])
 def update_vehicle(vehicle_id):
     vehicle= Vehicle.query.get(vehicle_id)
     if vehicle is None:
@@ -254,7 +337,7 @@ def update_vehicle(vehicle_id):
     db.session.commit()
     return jsonify(vehicle.serialize()), 200
 
-@app.route('/vehicles/<int:vehicle_id>', methods=['DELETE'])
+@api.route('/vehicles/<int:vehicle_id>', methods=['DELETE'])
 def delete_vehicle(vehicle_id):
     vehicle= Vehicle.query.get(vehicle_id)
     if vehicle is None:
@@ -263,9 +346,15 @@ def delete_vehicle(vehicle_id):
     db.session.commit()
     return jsonify({"msg":"Vehiculo eliminado"}), 200
 
-@app.route('/user/<int:user_id>/favorites', methods=['GET'])
+@api.route('/user/<int:user_id>/favorites', methods=['GET'])
 def get_user_favorites(user_id):
-    user = User.query.get(user_id)
+    # 1 query for the user + 1 per favorites list (joined to its target),
+    # no matter how many favorites the user has
+    user = db.session.get(User, user_id, options=[
+        selectinload(User.favoritecha).joinedload(FavoriteCharacters.character),
+        selectinload(User.favoriteveh).joinedload(FavoriteVehicles.vehicle),
+        selectinload(User.favoritepla).joinedload(FavoritePlanets.planet),
+    ])
     if user is None:
         return jsonify({"msg":f"El Usuario con id {user_id} no existe"}), 404
     favorite_characters=[]
@@ -282,98 +371,204 @@ def get_user_favorites(user_id):
         "favorite_vehicles": favorite_vehicles,
         "favorite_planets": favorite_planets}), 200
 
-@app.route('/user/<int:user_id>/favorites/people', methods=['POST'])
+@api.route('/user/<int:user_id>/favorites', methods=['PUT'])
+def replace_user_favorites(user_id):
+    user = get_entity(User, user_id)
+    if user is None:
+        return jsonify({"msg":f"El Usuario con id {user_id} no existe"}), 404
+    body=request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({"msg":"El body no puede estar vacio"}), 400
+    return set_favorites(user_id, body)
+
+@api.route('/user/<int:user_id>/favorites/people', methods=['POST'])
 def add_user_favorite_characters(user_id):
-    user = User.query.get(user_id)
+    user = get_entity(User, user_id)
     if user is None:
         return jsonify({"msg":f"El Usuario con id {user_id} no existe"}), 404
     body=request.get_json(silent=True)
     if body is None:
         return jsonify({"msg":"El body no puede estar vacio"}), 400
     if 'character_id' in body:
-        character= Characters.query.get(body['character_id'])
+        character= get_entity(Characters, body['character_id'])
         if character is None:
             return jsonify({"msg":f"El Personaje con id {body['character_id']} no existe"}), 404
+        if FavoriteCharacters.query.filter_by(user_id=user_id, character_id=character['id']).first() is not None:
+            return jsonify({"msg":f"Personaje {character['first_name']} ya esta en favoritos"}), 200
         new_favorite_character= FavoriteCharacters()
-        new_favorite_character.user_id=user.id
-        new_favorite_character.character_id=character.id
+        new_favorite_character.user_id=user_id
+        new_favorite_character.character_id=character['id']
         db.session.add(new_favorite_character)
-        db.session.commit()
-        return jsonify({"msg":f"Personaje {character.first_name} agregado a favoritos"}), 201
-
-@app.route('/user/<int:user_id>/favorites/vehicles', methods=['POST'])
+        try:
+            # flushes the favorite first, a duplicate fails before the count moves
+            change_favorite_count(Characters, new_favorite_character.character_id, 1)
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            missing = favorite_conflict(FavoriteCharacters.character_id, user_id, Characters, character['id'])
+            if missing is User:
+                invalidate(User, user_id)
+                return jsonify({"msg":f"El Usuario con id {user_id} no existe"}), 404
+            if missing is not None:
+                invalidate(Characters, character['id'])
+                return jsonify({"msg":f"El Personaje con id {character['id']} no existe"}), 404
+            # a concurrent request added the same favorite first
+            return jsonify({"msg":f"Personaje {character['first_name']} ya esta en favoritos"}), 200
+        return jsonify({"msg":f"Personaje {character['first_name']} agregado a favoritos"}), 201
+
+@api.route('/user/<int:user_id>/favorites/vehicles', methods=['POST'])
 def add_user_favorite_vehicles(user_id):
-    user = User.query.get(user_id)
+    user = get_entity(User, user_id)
     if user is None:
         return jsonify({"msg":f"El Usuario con id {user_id} no existe"}), 404
     body=request.get_json(silent=True)
     if body is None:
         return jsonify({"msg":"El body no puede estar vacio"}), 400
     if 'vehicle_id' in body:
-        vehicle= Vehicle.query.get(body['vehicle_id'])
+        vehicle= get_entity(Vehicle, body['vehicle_id'])
         if vehicle is None:
             return jsonify({"msg":f"El Vehiculo con id {body['vehicle_id']} no existe"}), 404
+        if FavoriteVehicles.query.filter_by(user_id=user_id, vehicle_id=body['vehicle_id']).first() is not None:
+            return jsonify({"msg":f"Vehiculo {vehicle['name']} ya esta en favoritos"}), 200
         new_favorite_vehicle= FavoriteVehicles()
-        new_favorite_vehicle.user_id=user.id
-        new_favorite_vehicle.vehicle_id=vehicle.id
+        new_favorite_vehicle.user_id=user_id
+        new_favorite_vehicle.vehicle_id=body['vehicle_id']
         db.session.add(new_favorite_vehicle)
-        db.session.commit()
-        return jsonify({"msg":f"Vehiculo {vehicle.name} agregado a favoritos"}), 201
-
-@app.route('/user/<int:user_id>/favorites/planets', methods=['POST'])
+        try:
+            change_favorite_count(Vehicle, new_favorite_vehicle.vehicle_id, 1)
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            missing = favorite_conflict(FavoriteVehicles.vehicle_id, user_id, Vehicle, body['vehicle_id'])
+            if missing is User:
+                invalidate(User, user_id)
+                return jsonify({"msg":f"El Usuario con id {user_id} no existe"}), 404
+            if missing is not None:
+                invalidate(Vehicle, body['vehicle_id'])
+                return jsonify({"msg":f"El Vehiculo con id {body['vehicle_id']} no existe"}), 404
+            # a concurrent request added the same favorite first
+            return jsonify({"msg":f"Vehiculo {vehicle['name']} ya esta en favoritos"}), 200
+        return jsonify({"msg":f"Vehiculo {vehicle['name']} agregado a favoritos"}), 201
+
+@api.route('/user/<int:user_id>/favorites/planets', methods=['POST'])
 def add_user_favorite_planets(user_id):
-    user = User.query.get(user_id)
+    user = get_entity(User, user_id)
     if user is None:
         return jsonify({"msg":f"El Usuario con id {user_id} no existe"}), 404
     body=request.get_json(silent=True)
     if body is None:
         return jsonify({"msg":"El body no puede estar vacio"}), 400
     if 'planet_id' in body:
-        planet= Planets.query.get(body['planet_id'])
+        planet= get_entity(Planets, body['planet_id'])
         if planet is None:
             return jsonify({"msg":f"El Planeta con ID {body['planet_id']} no existe"}), 404
+        if FavoritePlanets.query.filter_by(user_id=user_id, planet_id=planet['id']).first() is not None:
+            return jsonify({"msg":f"Planeta {planet['name']} ya esta en favoritos"}), 200
         new_favorite_planet= FavoritePlanets()
-        new_favorite_planet.user_id=user.id
-        new_favorite_planet.planet_id=planet.id
+        new_favorite_planet.user_id=user_id
+        new_favorite_planet.planet_id=planet['id']
         db.session.add(new_favorite_planet)
-        db.session.commit()
-        return jsonify({"msg":f"Planeta {planet.name} agregado a favoritos"}), 201
+        try:
+            change_favorite_count(Planets, new_favorite_planet.planet_id, 1)
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            missing = favorite_conflict(FavoritePlanets.planet_id, user_id, Planets, planet['id'])
+            if missing is User:
+                invalidate(User, user_id)
+                return jsonify({"msg":f"El Usuario con id {user_id} no existe"}), 404
+            if missing is not None:
+                invalidate(Planets, planet['id'])
+                return jsonify({"msg":f"El Planeta con ID {planet['id']} no existe"}), 404
+            # a concurrent request added the same favorite first
+            return jsonify({"msg":f"Planeta {planet['name']} ya esta en favoritos"}), 200
+        return jsonify({"msg":f"Planeta {planet['name']} agregado a favoritos"}), 201
     
-@app.route('/user/<int:user_id>/favorites/people/<int:favorite_id>', methods=['DELETE'])
+@api.route('/user/<int:user_id>/favorites/people/<int:favorite_id>', methods=['DELETE'])
 def delete_user_favorite_character(user_id, favorite_id):
-    user = User.query.get(user_id)
+    user = get_entity(User, user_id)
     if user is None:
         return jsonify({"msg":f"El Usuario con ID {user_id} no existe"}), 404
     favorite_character = FavoriteCharacters.query.get(favorite_id)
     if favorite_character is None:
         return jsonify({"msg":f"No tienes un personaje favorito con ID {favorite_id}"}), 404
     db.session.delete(favorite_character)
+    change_favorite_count(Characters, favorite_character.character_id, -1)
     db.session.commit()
     return jsonify({"msg":"Personaje eliminado de favoritos"}), 200
 
-@app.route('/user/<int:user_id>/favorites/vehicles/<int:favorite_id>', methods=['DELETE'])
+@api.route('/user/<int:user_id>/favorites/vehicles/<int:favorite_id>', methods=['DELETE'])
 def delete_user_favorite_vehicle(user_id, favorite_id):
-    user = User.query.get(user_id)
+    user = get_entity(User, user_id)
     if user is None:
         return jsonify({"msg":f"El Usuario con ID {user_id} no existe"}), 404
     favorite_vehicle = FavoriteVehicles.query.get(favorite_id)
     if favorite_vehicle is None:
         return jsonify({"msg":f"No tienes un vehiculo favorito con ID {favorite_id}"}), 404
     db.session.delete(favorite_vehicle)
+    change_favorite_count(Vehicle, favorite_vehicle.vehicle_id, -1)
     db.session.commit()
     return jsonify({"msg":"Vehiculo eliminado de favoritos"}), 200
 
-@app.route('/user/<int:user_id>/favorites/planets/<int:favorite_id>', methods=['DELETE'])
+@api.route('/user/<int:user_id>/favorites/planets/<int:favorite_id>', methods=['DELETE'])
 def delete_user_favorite_planet(user_id, favorite_id):  
-    user = User.query.get(user_id)
+    user = get_entity(User, user_id)
     if user is None:
         return jsonify({"msg":f"El Usuario con ID {user_id} no existe"}), 404
     favorite_planet = FavoritePlanets.query.get(favorite_id)
     if favorite_planet is None:
         return jsonify({"msg":f"No tienes un planeta favorito con ID {favorite_id}"}), 404
     db.session.delete(favorite_planet)
+    change_favorite_count(Planets, favorite_planet.planet_id, -1)
     db.session.commit()
     return jsonify({"msg":"Planeta eliminado de favoritos"}), 200
+
+@api.route('/popular/<entity>', methods=['GET'])
+def get_popular(entity):
+    model = POPULAR.get(entity)
+    if model is None:
+        return jsonify({"msg":f"No hay ranking de {entity}"}), 404
+    fields = serialize_fields(model)
+    statement = (select_fields(model, fields).add_columns(model.favorite_count)
+                 .where(model.favorite_count > 0)
+                 .order_by(model.favorite_count.desc(), model.id.desc())
+                 .limit(get_limit()))
+    items = [dict(zip(fields, row), favorite_count=row[-1]) for row in db.session.execute(statement)]
+    return json_response({'data': items})
+
+@api.route('/batch', methods=['POST'])
+def batch():
+    body=request.get_json(silent=True)
+    if not isinstance(body, list):
+        return jsonify({"msg":"El body debe ser una lista"}), 400
+    return run_batch(current_app._get_current_object(), body)
+
+@api.route('/search', methods=['GET'])
+def search_all():
+    q = request.args.get('q', '').strip()
+    if not q:
+        return jsonify({"msg":"El parametro q es necesario"}), 400
+    after = request.args.get('after')
+    results, next_cursor = search(q, get_limit(), decode_cursor(after) if after else None)
+    return json_response({'data': results, 'next': encode_cursor(*next_cursor) if next_cursor else None})
+
+@api.route('/export/<entity>.ndjson', methods=['GET'])
+def export_entity(entity):
+    model = EXPORTS.get(entity)
+    if model is None:
+        return jsonify({"msg":f"No se puede exportar {entity}"}), 404
+    def generate():
+        # yield_per streams the rows in batches (server side cursor on postgres),
+        # so memory stays flat regardless of the table size
+        fields = serialize_fields(model)
+        statement = select_fields(model, fields).order_by(model.id).execution_options(yield_per=EXPORT_BATCH_SIZE)
+        for partition in db.session.execute(statement).partitions():
+            yield b"".join(dumps(dict(zip(fields, row))) + b"\n" for row in partition)
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+# the application used by wsgi.py, asgi.py and `flask run`
+app = create_app()
+
 # this only runs if `$ python src/app.py` is executed
 
 
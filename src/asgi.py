@@ -0,0 +1,250 @@
+"""
+ASGI entry point, an alternative to wsgi.py for I/O bound loads:
+
+    $ uvicorn asgi:application --app-dir src --workers 4
+
+The read endpoints below are served by async views on an async engine
+(aiosqlite for sqlite, asyncpg for postgres), so a worker keeps accepting
+requests while their queries are in flight. They reuse the models, the
+query building of listing.py and serializers.py and the Flask request
+hooks (metrics, CORS), and answer the same JSON and ETags as the Flask views.
+Every other route is handed to the Flask app through asgiref's WSGI adapter,
+which runs it in a thread.
+
+The entity cache of the by-id endpoints is not used here, each lookup is a
+primary key query.
+"""
+import io
+import sys
+from functools import wraps
+from asgiref.wsgi import WsgiToAsgi
+from flask import jsonify
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import selectinload
+from werkzeug.exceptions import HTTPException
+from werkzeug.routing import Map, Rule
+from app import app
+from dbpool import engine_options
+from replica import reads_from_replica, REPLICA
+from listing import page_statement, page_result, get_fields_arg
+from serializers import serialize_fields, select_fields, json_response
+from utils import APIException
+from versioning import make_etag, matching_etag, table_version
+from models import enable_sqlite_foreign_keys, User, Characters, Planets, Vehicle, FavoriteCharacters, FavoritePlanets, FavoriteVehicles
+
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+}
+
+def async_url(database_uri):
+    url = make_url(database_uri)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+def async_engine_options(database_uri):
+    # same sizes as the sync pool, the async engine brings its own pool class
+    options = engine_options(database_uri)
+    options.pop('poolclass', None)
+    return options
+
+def make_engine(database_uri):
+    engine = create_async_engine(async_url(database_uri), **async_engine_options(database_uri))
+    enable_sqlite_foreign_keys(engine.sync_engine)
+    return engine
+
+engine = make_engine(app.config['SQLALCHEMY_DATABASE_URI'])
+Session = async_sessionmaker(engine, expire_on_commit=False)
+# for the requests replica.py sends to the replica (DATABASE_READ_URL)
+binds = app.config.get('SQLALCHEMY_BINDS', {})
+replica_engine = make_engine(binds[REPLICA]['url']) if REPLICA in binds else engine
+ReplicaSession = async_sessionmaker(replica_engine, expire_on_commit=False)
+
+async def get_version(session, model):
+    version = (await session.execute(
+        select(table_version.c.version).where(table_version.c.name == model.__tablename__))).scalar()
+    return version or 0
+
+def conditional(model):
+    # async version of versioning.conditional
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(session, **kwargs):
+            etag = make_etag(model, await get_version(session, model))
+            matched = matching_etag(etag)
+            if matched is not None:
+                response = app.response_class(status=304)
+                response.set_etag(matched)
+                return response
+            response = app.make_response(await view(session, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag)
+            return response
+        return wrapper
+    return decorator
+
+async def paginate(session, model):
+    statement, page = page_statement(model)
+    rows = (await session.execute(statement)).all()
+    return page_result(rows, *page)
+
+async def get_entity(session, model, id):
+    fields = get_fields_arg(model) or serialize_fields(model)
+    row = (await session.execute(select_fields(model, fields).where(model.id == id))).first()
+    return dict(zip(fields, row)) if row is not None else None
+
+async def get_users(session):
+    users, next_cursor = await paginate(session, User)
+    return json_response({'data': users, 'next': next_cursor})
+
+async def get_user_id(session, user_id):
+    user = await get_entity(session, User, user_id)
+    if user is None:
+        return jsonify({"msg":"User no existe"}), 404
+    return json_response(user)
+
+@conditional(Characters)
+async def get_characters(session):
+    characters, next_cursor = await paginate(session, Characters)
+    return json_response({'data': characters, 'next': next_cursor})
+
+@conditional(Characters)
+async def get_character_id(session, character_id):
+    character = await get_entity(session, Characters, character_id)
+    if character is None:
+        return jsonify({"msg":"Personaje no existe"}), 404
+    return json_response(character)
+
+@conditional(Planets)
+async def get_planets(session):
+    planets, next_cursor = await paginate(session, Planets)
+    return json_response({'data': planets, 'next': next_cursor})
+
+@conditional(Planets)
+async def get_planets_id(session, planet_id):
+    planet = await get_entity(session, Planets, planet_id)
+    if planet is None:
+        return jsonify({'msg': "Planeta no existe"}), 404
+    return json_response(planet)
+
+@conditional(Vehicle)
+async def get_vehicles(session):
+    vehicles, next_cursor = await paginate(session, Vehicle)
+    return json_response({'data': vehicles, 'next': next_cursor})
+
+@conditional(Vehicle)
+async def get_vehicles_id(session, vehicles_id):
+    vehicle = await get_entity(session, Vehicle, vehicles_id)
+    if vehicle is None:
+        return jsonify ({'msg': "Vehiculo no existe"}), 400
+    return json_response(vehicle)
+
+async def get_user_favorites(session, user_id):
+    user = await session.get(User, user_id, options=[
+        selectinload(User.favoritecha).joinedload(FavoriteCharacters.character),
+        selectinload(User.favoriteveh).joinedload(FavoriteVehicles.vehicle),
+        selectinload(User.favoritepla).joinedload(FavoritePlanets.planet),
+    ])
+    if user is None:
+        return jsonify({"msg":f"El Usuario con id {user_id} no existe"}), 404
+    return json_response({
+        "favorite_characters": [favorite.character.serialize() for favorite in user.favoritecha],
+        "favorite_vehicles": [favorite.vehicle.serialize() for favorite in user.favoriteveh],
+        "favorite_planets": [favorite.planet.serialize() for favorite in user.favoritepla]})
+
+VIEWS = {view.__name__: view for view in (
+    get_users, get_user_id, get_characters, get_character_id, get_planets, get_planets_id,
+    get_vehicles, get_vehicles_id, get_user_favorites,
+)}
+
+# the same rules and endpoint names as app.py, GET only
+routes = Map([
+    Rule('/users', endpoint='get_users'),
+    Rule('/users/<int:user_id>', endpoint='get_user_id'),
+    Rule('/people', endpoint='get_characters'),
+    Rule('/people/<int:character_id>', endpoint='get_character_id'),
+    Rule('/planets', endpoint='get_planets'),
+    Rule('/planets/<int:planet_id>', endpoint='get_planets_id'),
+    Rule('/vehicles', endpoint='get_vehicles'),
+    Rule('/vehicles/<int:vehicles_id>', endpoint='get_vehicles_id'),
+    Rule('/user/<int:user_id>/favorites', endpoint='get_user_favorites'),
+], strict_slashes=False)
+adapter = routes.bind('localhost')
+
+def build_environ(scope):
+    # WSGI environ of a request without body, for the Flask request context
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode().decode('latin-1'),
+        'PATH_INFO': scope['path'].encode().decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = f'HTTP_{name}'
+        value = value.decode('latin-1')
+        environ[name] = f"{environ[name]},{value}" if name in environ else value
+    return environ
+
+async def dispatch(view, scope, view_args, send):
+    with app.request_context(build_environ(scope)):
+        try:
+            response = app.preprocess_request()
+            if response is None:
+                async with (ReplicaSession if reads_from_replica() else Session)() as session:
+                    response = await view(session, **view_args)
+        except APIException as error:
+            response = (jsonify(error.to_dict()), error.status_code)
+        except HTTPException as error:
+            response = error
+        except Exception as error:
+            response = app.handle_exception(error)
+        response = app.process_response(app.make_response(response))
+        body = response.get_data()
+    await send({
+        'type': 'http.response.start',
+        'status': response.status_code,
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                    for name, value in response.headers.to_wsgi_list()],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await engine.dispose()
+            await replica_engine.dispose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+flask_application = WsgiToAsgi(app)
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] == 'http' and scope['method'] == 'GET':
+        try:
+            endpoint, view_args = adapter.match(scope['path'], method='GET')
+        except HTTPException:
+            # not one of the async routes (or a redirect), Flask answers it
+            pass
+        else:
+            return await dispatch(VIEWS[endpoint], scope, view_args, send)
+    return await flask_application(scope, receive, send)
@@ -0,0 +1,104 @@
+"""
+POST /batch: runs a list of sub-requests through the regular views, in order,
+within a single HTTP request.
+
+    [{"method": "GET", "path": "/people/1"},
+     {"method": "PUT", "path": "/planets/2", "body": {"population": 10}, "headers": {}}]
+
+Every sub-request gets its own app and request context, so hooks, metrics and
+error handlers behave as in a normal request, but they all share one session
+bound to a single database transaction. The views' commits only release a
+savepoint; the transaction is committed once every sub-request has run. A
+write (any method but GET/HEAD/OPTIONS) answering >= 400 stops the batch and
+rolls back everything, reads can fail without affecting the others.
+"""
+import json
+import os
+from flask import jsonify
+from sqlalchemy.orm import Session
+from werkzeug.test import EnvironBuilder
+from cache import entity_cache
+from models import db
+
+BATCH_MAX_REQUESTS = int(os.environ.get('BATCH_MAX_REQUESTS', 50))
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+def validate_item(item):
+    if not isinstance(item, dict):
+        return "Cada elemento debe ser un objeto"
+    if not isinstance(item.get('method'), str):
+        return "El method es necesario"
+    if not isinstance(item.get('path'), str) or not item['path'].startswith('/'):
+        return "El path es necesario y debe empezar por /"
+    if item['path'].split('?')[0].rstrip('/') == '/batch':
+        return "No se puede anidar /batch"
+    if not isinstance(item.get('headers', {}), dict):
+        return "headers debe ser un objeto"
+    return None
+
+def dispatch(app, session, item):
+    # the bodies are embedded as JSON, only the batch response is compressed
+    headers = {name: value for name, value in item.get('headers', {}).items() if name.lower() != 'accept-encoding'}
+    builder = EnvironBuilder(
+        path=item['path'],
+        method=item['method'].upper(),
+        json=item['body'] if 'body' in item else None,
+        headers=headers,
+    )
+    with app.app_context():
+        # the views use db.session, make it the batch session for this context
+        db.session.registry.set(session)
+        with app.request_context(builder.get_environ()):
+            try:
+                response = app.full_dispatch_request()
+            except Exception as e:
+                response = app.handle_exception(e)
+            data = response.get_data()
+    if response.is_json and data:
+        body = json.loads(data)
+    else:
+        body = data.decode(errors='replace')
+    return response.status_code, body
+
+def run_batch(app, items):
+    if len(items) > BATCH_MAX_REQUESTS:
+        return jsonify({"msg":f"No se pueden enviar mas de {BATCH_MAX_REQUESTS} operaciones por batch"}), 400
+    for index, item in enumerate(items):
+        error = validate_item(item)
+        if error is not None:
+            return jsonify({"msg":f"Operacion {index}: {error}"}), 400
+
+    responses = []
+    failed = None
+    committed = False
+    with db.engine.connect() as connection:
+        transaction = connection.begin()
+        if connection.dialect.name == 'sqlite':
+            # pysqlite only emits BEGIN before DML, a SAVEPOINT outside of a
+            # transaction starts one that its RELEASE would commit. A batch
+            # that writes takes the write lock up front: two deferred batches
+            # reading and then writing would deadlock (database is locked)
+            # instead of waiting for each other
+            writes = any(item['method'].upper() not in READ_METHODS for item in items)
+            connection.exec_driver_sql("BEGIN IMMEDIATE" if writes else "BEGIN")
+        session = Session(bind=connection, join_transaction_mode="create_savepoint")
+        try:
+            for index, item in enumerate(items):
+                status, body = dispatch(app, session, item)
+                responses.append({"status": status, "body": body})
+                if item['method'].upper() not in READ_METHODS and status >= 400:
+                    failed = index
+                    break
+            if failed is None:
+                transaction.commit()
+                committed = True
+        finally:
+            session.close()
+            if not committed:
+                transaction.rollback()
+                # reads inside the batch may have cached rows that were rolled back
+                entity_cache.delete_where(lambda key: True)
+
+    if failed is not None:
+        return jsonify({"msg":f"La operacion {failed} fallo, no se aplico ningun cambio", "responses": responses}), 400
+    return jsonify({"responses": responses}), 200
@@ -0,0 +1,126 @@
+"""
+In-process cache of serialized entities for the by-id lookups.
+
+Entries are evicted in LRU order once ENTITY_CACHE_SIZE is reached and
+expire after ENTITY_CACHE_TTL seconds. Every flush that writes a versioned
+entity, whatever session it goes through, records its key and bumps its
+table's version (see versioning.py). The worker that committed drops the
+keys right after the commit; the other gunicorn workers poll the
+table_version counters at most once per ENTITY_CACHE_SYNC_INTERVAL seconds
+and drop the cached rows of any table whose version moved. A write is therefore visible on every worker
+after at most ENTITY_CACHE_SYNC_INTERVAL seconds.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from serializers import get_fields
+from versioning import get_versions
+from replica import pinned_to_primary
+
+ENTITY_CACHE_SIZE = int(os.environ.get('ENTITY_CACHE_SIZE', 10000))
+ENTITY_CACHE_TTL = float(os.environ.get('ENTITY_CACHE_TTL', 60))
+ENTITY_CACHE_SYNC_INTERVAL = float(os.environ.get('ENTITY_CACHE_SYNC_INTERVAL', 1))
+
+MISSING = object()
+
+class LRUCache:
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return MISSING
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_where(self, predicate):
+        with self._lock:
+            for key in [key for key in self._data if predicate(key)]:
+                del self._data[key]
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+        }
+
+
+entity_cache = LRUCache(ENTITY_CACHE_SIZE, ENTITY_CACHE_TTL)
+_versions = {}
+_last_sync = 0.0
+_sync_lock = threading.Lock()
+
+def sync():
+    global _last_sync
+    if time.monotonic() - _last_sync < ENTITY_CACHE_SYNC_INTERVAL:
+        return
+    with _sync_lock:
+        if time.monotonic() - _last_sync < ENTITY_CACHE_SYNC_INTERVAL:
+            return
+        for name, version in get_versions().items():
+            # a table without a row yet is at version 0 (see versioning.get_version)
+            if _versions.get(name, 0) != version:
+                entity_cache.delete_where(lambda key: key[0] == name)
+            _versions[name] = version
+        _last_sync = time.monotonic()
+
+def get_entity(model, id, fields=None):
+    # serialized entity or None, misses are not cached. With a subset of fields
+    # a hit is trimmed and a miss selects only those columns, without filling the cache.
+    sync()
+    if pinned_to_primary():
+        # the cache may hold rows read from the replica before this client's write
+        return get_fields(model, id, fields)
+    key = (model.__tablename__, id)
+    value = entity_cache.get(key)
+    if value is not MISSING:
+        return {field: value[field] for field in fields} if fields else value
+    if fields:
+        return get_fields(model, id, fields)
+    value = get_fields(model, id)
+    if value is None:
+        return None
+    entity_cache.set(key, value)
+    return value
+
+def invalidate(model, id=None):
+    if id is None:
+        entity_cache.delete_where(lambda key: key[0] == model.__tablename__)
+    else:
+        entity_cache.delete((model.__tablename__, id))
+
+@event.listens_for(Session, 'after_transaction_end')
+def invalidate_flushed(session, transaction):
+    # once the outermost transaction is committed, or rolled back: a read in
+    # between may have cached what was flushed
+    if transaction.parent is None:
+        for key in session.info.pop('flushed_entities', ()):
+            entity_cache.delete(key)
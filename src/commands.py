@@ -0,0 +1,264 @@
+"""
+Flask CLI commands, registered in app.py with setup_commands(app)
+
+    $ flask import people data/people.json
+    $ flask import vehicles data/vehicles.ndjson --batch-size 20000 --resume
+    $ flask popularity reconcile
+    $ flask db upgrade
+"""
+import json
+import os
+import re
+import time
+import click
+from flask import current_app
+from sqlalchemy import select, update, func, text
+from models import db, Characters, Planets, Vehicle
+from utils import insert_rows
+from versioning import bump_version
+from search import rebuild_index
+from favorites import FAVORITE_SETS
+
+URL_ID = re.compile(r'/(\d+)/?$')
+WHITESPACE = re.compile(r'[\s,]*')
+
+def iter_json_array(file, chunk_size=1 << 20):
+    # Decodes the items of a top level JSON array one by one, keeping only
+    # the current chunk of the file in memory
+    decoder = json.JSONDecoder()
+    buffer = file.read(chunk_size).lstrip()
+    if not buffer.startswith('['):
+        raise click.ClickException("El archivo debe contener un array JSON")
+    pos = 1
+    eof = False
+    while True:
+        pos = WHITESPACE.match(buffer, pos).end()
+        if buffer.startswith(']', pos):
+            return
+        try:
+            item, pos = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise click.ClickException(f"JSON invalido cerca de: {buffer[pos:pos + 80]}")
+            more = file.read(chunk_size)
+            eof = not more
+            buffer = buffer[pos:] + more
+            pos = 0
+            continue
+        yield item
+
+def iter_records(path):
+    with open(path, encoding='utf-8') as file:
+        if path.endswith(('.ndjson', '.jsonl')):
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+            return
+        start = file.read(1024).lstrip()
+        file.seek(0)
+        if start.startswith('{'):
+            # a single SWAPI page: {"count": .., "results": [...]}
+            yield from json.load(file).get('results', [])
+        else:
+            yield from iter_json_array(file)
+
+def flatten(record):
+    # Accepts the shapes SWAPI data comes in: the API objects (with "url"),
+    # the Django fixtures ({"pk": .., "fields": {..}}) and swapi.tech
+    # ({"uid": .., "properties": {..}})
+    if 'fields' in record:
+        return dict(record['fields'], id=record.get('pk'))
+    if 'properties' in record:
+        return dict(record['properties'], id=record.get('uid'))
+    record = dict(record)
+    if 'id' not in record and isinstance(record.get('url'), str):
+        match = URL_ID.search(record['url'])
+        if match:
+            record['id'] = match.group(1)
+    return record
+
+def to_int(value):
+    if isinstance(value, str):
+        value = value.replace(',', '').strip()
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def to_id(value):
+    if isinstance(value, str) and URL_ID.search(value):
+        return int(URL_ID.search(value).group(1))
+    return to_int(value)
+
+def character_row(record):
+    first_name, _, last_name = (record.get('first_name') or record.get('name') or '').partition(' ')
+    specie = record.get('specie') or record.get('species')
+    if isinstance(specie, list):
+        specie = specie[0] if specie else None
+    if isinstance(specie, str) and URL_ID.search(specie):
+        specie = f"species/{to_id(specie)}"
+    return {
+        "id": to_id(record.get('id')),
+        "first_name": first_name,
+        "last_name": record.get('last_name', last_name or None),
+        "specie": specie or 'unknown',
+        "height": to_int(record.get('height')),
+    }
+
+def planet_row(record):
+    return {
+        "id": to_id(record.get('id')),
+        "name": record.get('name'),
+        "population": to_int(record.get('population')),
+        "climate": record.get('climate'),
+    }
+
+class VehicleRows:
+    # vehicle.driver_id is unique, so a pilot only drives the first vehicle it is found in
+    def __init__(self):
+        self.used_drivers = set(db.session.scalars(
+            select(Vehicle.driver_id).where(Vehicle.driver_id.is_not(None))))
+
+    def __call__(self, record):
+        driver_id = to_id(record.get('driver_id'))
+        if driver_id is None:
+            for pilot in record.get('pilots') or []:
+                if to_id(pilot) not in self.used_drivers:
+                    driver_id = to_id(pilot)
+                    break
+        if driver_id in self.used_drivers:
+            driver_id = None
+        if driver_id is not None:
+            self.used_drivers.add(driver_id)
+        return {
+            "id": to_id(record.get('id')),
+            "name": record.get('name'),
+            "max_speed": to_int(record.get('max_speed', record.get('max_atmosphering_speed'))),
+            "driver_id": driver_id,
+        }
+
+IMPORTS = {
+    'people': (Characters, lambda: character_row),
+    'planets': (Planets, lambda: planet_row),
+    'vehicles': (Vehicle, VehicleRows),
+}
+
+def fix_sequence(model):
+    # rows inserted with an explicit id do not advance the postgres sequence
+    if db.engine.dialect.name == 'postgresql':
+        table = model.__tablename__
+        db.session.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), COALESCE((SELECT MAX(id) FROM \"{table}\"), 1))"))
+        db.session.commit()
+
+class MigrationsGroup(click.Group):
+    # `flask db ...` of Flask-Migrate. Importing it pulls in alembic, so it is
+    # only loaded when a db command runs, not by the app or the other commands
+    def load(self):
+        app = current_app._get_current_object()
+        if 'migrate' not in app.extensions:
+            from flask_migrate import Migrate
+            Migrate(app, db)
+        from flask_migrate.cli import db as migrate_cli
+        return migrate_cli
+
+    def list_commands(self, ctx):
+        return self.load().list_commands(ctx)
+
+    def get_command(self, ctx, name):
+        return self.load().get_command(ctx, name)
+
+def setup_commands(app):
+    app.cli.add_command(MigrationsGroup("db", help="Perform database migrations."))
+
+    @app.cli.command("import")
+    @click.argument("entity", type=click.Choice(sorted(IMPORTS)))
+    @click.argument("path", type=click.Path(exists=True, dir_okay=False))
+    @click.option("--batch-size", default=5000, show_default=True, help="Rows per commit")
+    @click.option("--resume", is_flag=True, help="Skip the records committed by a previous interrupted run")
+    def import_data(entity, path, batch_size, resume):
+        """Bulk load a SWAPI style JSON or NDJSON dump."""
+        model, make_row = IMPORTS[entity]
+        to_row = make_row()
+        checkpoint = f"{path}.checkpoint"
+        skip = 0
+        if resume and os.path.exists(checkpoint):
+            with open(checkpoint) as file:
+                skip = int(file.read() or 0)
+            click.echo(f"Resuming after {skip} records")
+
+        done = skip
+        imported = 0
+        failures = 0
+        started = time.perf_counter()
+        rows = []
+
+        def commit():
+            nonlocal imported, failures
+            # executemany needs the same columns in every row
+            with_id = [row for row in rows if 'id' in row[1]]
+            without_id = [row for row in rows if 'id' not in row[1]]
+            created, failed = insert_rows(model, with_id, chunk_size=batch_size)
+            more_created, more_failed = insert_rows(model, without_id, chunk_size=batch_size)
+            created += more_created
+            failed += more_failed
+            for key, msg in failed:
+                click.echo(f"record {key}: {msg}", err=True)
+            bump_version(model)
+            db.session.commit()
+            # only advanced once the batch is committed, so --resume never skips lost rows
+            with open(checkpoint, 'w') as file:
+                file.write(str(done))
+            imported += len(created)
+            failures += len(failed)
+            rows.clear()
+            rate = imported / (time.perf_counter() - started)
+            click.echo(f"{done} records read, {imported} imported, {failures} failed ({rate:.0f} rows/s)")
+
+        for number, record in enumerate(iter_records(path)):
+            if number < skip:
+                continue
+            values = to_row(flatten(record))
+            if values['id'] is None:
+                del values['id']
+            rows.append((number, values))
+            done = number + 1
+            if len(rows) >= batch_size:
+                commit()
+        if rows:
+            commit()
+
+        fix_sequence(model)
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        elapsed = time.perf_counter() - started
+        click.echo(f"Imported {imported} {entity} in {elapsed:.1f}s ({imported / max(elapsed, 1e-9):.0f} rows/s)")
+
+    @app.cli.command("search-index")
+    def search_index():
+        """Create the search index if missing and repopulate it."""
+        rebuild_index()
+        click.echo("Search index rebuilt")
+
+    @app.cli.group("popularity")
+    def popularity():
+        """favorite_count of characters, planets and vehicles."""
+
+    @popularity.command("reconcile")
+    @click.option("--batch-size", default=10000, show_default=True, help="Ids per transaction")
+    def reconcile(batch_size):
+        """Recompute favorite_count from the favorite tables where it drifted."""
+        for favorite, column, target, _ in FAVORITE_SETS.values():
+            actual = select(func.count()).select_from(favorite).where(column == target.id).scalar_subquery()
+            last_id = db.session.scalar(select(func.max(target.id))) or 0
+            fixed = 0
+            for start in range(0, last_id, batch_size):
+                # id ranges keep every transaction (and its locks) short
+                result = db.session.execute(
+                    update(target)
+                    .where(target.id > start, target.id <= start + batch_size, target.favorite_count != actual)
+                    .values(favorite_count=actual)
+                    .execution_options(synchronize_session=False))
+                db.session.commit()
+                fixed += result.rowcount
+            click.echo(f"{target.__tablename__}: {fixed} counters fixed")
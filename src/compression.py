@@ -0,0 +1,124 @@
+"""
+Negotiated compression of the JSON and NDJSON responses.
+
+The encoding is picked from Accept-Encoding among zstd and br, when the
+zstandard and brotli packages are installed, and gzip. On equal client
+quality the order of ENCODERS decides. Buffered responses are compressed
+once they reach COMPRESSION_MIN_SIZE bytes. Streamed responses (the NDJSON
+exports) are always compressed, chunk by chunk, each chunk flushed so the
+client can decode it as soon as it arrives.
+
+A compressed response gets the ETag of its encoding, "<etag>-<encoding>",
+and versioning.conditional recognizes those in If-None-Match. Compressed
+bodies with an ETag are kept in an LRU keyed by (ETag, encoding), so an
+unchanged version is compressed once per worker and not on every request.
+"""
+import gzip
+import os
+import zlib
+from flask import request
+from cache import LRUCache, MISSING
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+COMPRESSION_CACHE_SIZE = int(os.environ.get('COMPRESSION_CACHE_SIZE', 256))
+COMPRESSION_CACHE_TTL = float(os.environ.get('COMPRESSION_CACHE_TTL', 300))
+COMPRESSIBLE = ('application/json', 'application/x-ndjson')
+
+compressed_cache = LRUCache(COMPRESSION_CACHE_SIZE, COMPRESSION_CACHE_TTL)
+
+class GzipEncoder:
+    def compress(self, data):
+        return gzip.compress(data, compresslevel=6, mtime=0)
+
+    def stream(self, chunks):
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for chunk in chunks:
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+
+class BrotliEncoder:
+    # quality 5: much smaller than gzip 6 for a little more CPU
+    def compress(self, data):
+        return brotli.compress(data, quality=5, mode=brotli.MODE_TEXT)
+
+    def stream(self, chunks):
+        compressor = brotli.Compressor(quality=5, mode=brotli.MODE_TEXT)
+        for chunk in chunks:
+            yield compressor.process(chunk) + compressor.flush()
+        yield compressor.finish()
+
+class ZstdEncoder:
+    def compress(self, data):
+        return zstandard.ZstdCompressor(level=3).compress(data)
+
+    def stream(self, chunks):
+        compressor = zstandard.ZstdCompressor(level=3).compressobj()
+        for chunk in chunks:
+            yield compressor.compress(chunk) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        yield compressor.flush()
+
+ENCODERS = {}
+if zstandard is not None:
+    ENCODERS['zstd'] = ZstdEncoder()
+if brotli is not None:
+    ENCODERS['br'] = BrotliEncoder()
+ENCODERS['gzip'] = GzipEncoder()
+
+def choose_encoding():
+    return request.accept_encodings.best_match(ENCODERS)
+
+def compressed(data, etag, encoding):
+    if etag is None:
+        return ENCODERS[encoding].compress(data)
+    key = (etag, encoding)
+    value = compressed_cache.get(key)
+    if value is MISSING:
+        value = ENCODERS[encoding].compress(data)
+        compressed_cache.set(key, value)
+    return value
+
+def stream_compressed(encoder, chunks):
+    # closes the view's generator too when the client goes away mid stream
+    try:
+        yield from encoder.stream(chunks)
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+def setup_compression(app):
+
+    @app.after_request
+    def compress_response(response):
+        if response.status_code == 304:
+            response.vary.add('Accept-Encoding')
+            return response
+        if (response.mimetype not in COMPRESSIBLE or response.status_code < 200 or response.status_code == 204
+                or 'Content-Encoding' in response.headers or response.direct_passthrough):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = choose_encoding()
+        if encoding is None:
+            return response
+        etag, weak = response.get_etag()
+        if response.is_streamed:
+            response.response = stream_compressed(ENCODERS[encoding], response.response)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < COMPRESSION_MIN_SIZE:
+                return response
+            response.set_data(compressed(data, etag if not weak else None, encoding))
+        response.headers['Content-Encoding'] = encoding
+        if etag is not None:
+            response.set_etag(f'{etag}-{encoding}', weak)
+        return response
@@ -0,0 +1,81 @@
+"""
+Connection pool configuration read from the environment, plus checkout wait
+statistics for /_internal/pool, per bind (the primary and the replica).
+
+    DB_POOL_SIZE=5          connections kept open per process
+    DB_MAX_OVERFLOW=10      extra connections allowed under load
+    DB_POOL_TIMEOUT=30      seconds to wait for a connection before failing
+    DB_POOL_RECYCLE=1800    seconds after which a connection is replaced (-1 never)
+    DB_POOL_PRE_PING=true   test connections on checkout
+
+Every gunicorn worker has its own pool, so the database sees up to
+workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections.
+"""
+import os
+import threading
+import time
+from sqlalchemy.pool import QueuePool
+
+class TimedQueuePool(QueuePool):
+    # QueuePool that accumulates the time spent waiting for a connection, per
+    # pool: the primary and the replica engine each count their own waits
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            "checkouts": 0,
+            "wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+            "timeouts": 0,
+        }
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            self._record(time.perf_counter() - start, "timeouts")
+            raise
+        self._record(time.perf_counter() - start, "checkouts")
+        return connection
+
+    def _record(self, waited, counter):
+        with self._stats_lock:
+            self.stats[counter] += 1
+            self.stats["wait_seconds"] += waited
+            self.stats["max_wait_seconds"] = max(self.stats["max_wait_seconds"], waited)
+
+def env_flag(name, default):
+    return os.environ.get(name, str(default)).lower() in ('1', 'true', 'yes', 'on')
+
+def engine_options(database_uri):
+    if database_uri in ('sqlite://', 'sqlite:///') or ':memory:' in database_uri:
+        # in memory sqlite databases live in a single connection
+        return {}
+    return {
+        "poolclass": TimedQueuePool,
+        "pool_size": int(os.environ.get('DB_POOL_SIZE', 5)),
+        "max_overflow": int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        "pool_timeout": int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        "pool_recycle": int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        "pool_pre_ping": env_flag('DB_POOL_PRE_PING', True),
+    }
+
+def pool_status(engine):
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return {"pool": pool.status()}
+    current = {}
+    if isinstance(pool, TimedQueuePool):
+        with pool._stats_lock:
+            current.update(pool.stats)
+    current.update({
+        "pool_size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "max_overflow": pool._max_overflow,
+        "timeout": pool.timeout(),
+    })
+    return current
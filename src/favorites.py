@@ -0,0 +1,102 @@
+"""
+PUT /user/<id>/favorites: replaces a user's favorites with the given sets.
+
+    {"character_ids": [1, 2], "planet_ids": [], "vehicle_ids": [4]}
+
+A missing key leaves that type untouched, an empty list clears it. Per type
+it runs one query to check the ids exist, one DELETE of the favorites not in
+the set and one INSERT ... SELECT of the ids not yet favorited, all in the
+same transaction.
+
+The favorite_count column of characters, planets and vehicles is moved in the
+same transaction as every favorite that is added or removed (see
+change_favorite_count), `flask popularity reconcile` recomputes it.
+"""
+from flask import jsonify
+from sqlalchemy import select, delete, insert, update, literal, exists
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.sql import Select
+from models import db, User, Characters, Planets, Vehicle, FavoriteCharacters, FavoritePlanets, FavoriteVehicles
+
+# body key: (favorite model, its target column, target model, name in the messages)
+FAVORITE_SETS = {
+    'character_ids': (FavoriteCharacters, FavoriteCharacters.character_id, Characters, "personajes"),
+    'planet_ids': (FavoritePlanets, FavoritePlanets.planet_id, Planets, "planetas"),
+    'vehicle_ids': (FavoriteVehicles, FavoriteVehicles.vehicle_id, Vehicle, "vehiculos"),
+}
+
+def change_favorite_count(model, ids, delta):
+    # ids is one id, a list of ids or a select of ids
+    if isinstance(ids, (list, tuple, set, Select)):
+        clause = model.id.in_(ids)
+    else:
+        clause = model.id == ids
+    db.session.execute(update(model).where(clause).values(favorite_count=model.favorite_count + delta))
+
+def forget_user_favorites(user_id):
+    # the database deletes a user's favorites (ON DELETE CASCADE), their
+    # targets lose a favorite each
+    for favorite, column, target, _ in FAVORITE_SETS.values():
+        change_favorite_count(target, select(column).where(favorite.user_id == user_id), -1)
+
+def favorite_conflict(column, user_id, target, target_id):
+    """
+    What an IntegrityError adding a favorite was about, after the rollback.
+    None when the favorite is there: the unique index, a concurrent request
+    added it first. Otherwise the foreign key: the model, User or the target,
+    whose row was deleted after the cache read it.
+    """
+    favorite = column.class_
+    if db.session.scalar(select(exists().where(favorite.user_id == user_id, column == target_id))):
+        return None
+    if not db.session.scalar(select(exists().where(User.id == user_id))):
+        return User
+    return target
+
+def parse_ids(value):
+    if not isinstance(value, list) or not all(isinstance(id, int) and not isinstance(id, bool) for id in value):
+        return None
+    return set(value)
+
+def set_favorites(user_id, body):
+    desired = {}
+    for key, value in body.items():
+        if key not in FAVORITE_SETS:
+            return jsonify({"msg":f"Clave desconocida: {key}"}), 400
+        ids = parse_ids(value)
+        if ids is None:
+            return jsonify({"msg":f"{key} debe ser una lista de ids"}), 400
+        desired[key] = ids
+    if not desired:
+        return jsonify({"msg":f"Se necesita al menos una de: {', '.join(FAVORITE_SETS)}"}), 400
+
+    for key, ids in desired.items():
+        _, _, target, name = FAVORITE_SETS[key]
+        found = set(db.session.scalars(select(target.id).where(target.id.in_(ids))))
+        if found != ids:
+            missing = ", ".join(str(id) for id in sorted(ids - found))
+            return jsonify({"msg":f"No existen {name} con id {missing}"}), 404
+
+    result = {}
+    try:
+        for key, ids in desired.items():
+            favorite, column, target, _ = FAVORITE_SETS[key]
+            removed = db.session.scalars(
+                delete(favorite).where(favorite.user_id == user_id, column.not_in(ids)).returning(column)).all()
+            already = exists().where(favorite.user_id == user_id, column == target.id)
+            added = db.session.scalars(
+                insert(favorite).from_select(
+                    ['user_id', column.key],
+                    select(literal(user_id), target.id).where(target.id.in_(ids), ~already),
+                ).returning(column)).all()
+            if removed:
+                change_favorite_count(target, removed, -1)
+            if added:
+                change_favorite_count(target, added, 1)
+            result[key] = {"added": sorted(added), "removed": sorted(removed)}
+        db.session.commit()
+    except IntegrityError:
+        # a concurrent request changed the same favorites
+        db.session.rollback()
+        return jsonify({"msg":"Los favoritos cambiaron mientras se actualizaban, intentalo de nuevo"}), 409
+    return jsonify(result), 200
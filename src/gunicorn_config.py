@@ -0,0 +1,97 @@
+"""
+gunicorn settings for wsgi.py, read from the environment:
+
+    $ gunicorn -c src/gunicorn_config.py wsgi --chdir ./src/
+
+    GUNICORN_WORKER_CLASS         sync (default), gthread or gevent
+    WEB_CONCURRENCY               worker processes, 2 * CPUs + 1 by default
+    GUNICORN_THREADS              threads per gthread worker (4)
+    GUNICORN_PRELOAD              import the app once in the master (true)
+    GUNICORN_MAX_REQUESTS         recycle a worker after this many requests,
+    GUNICORN_MAX_REQUESTS_JITTER  plus a random 0..jitter so they do not all
+                                  restart together (1000 and 100, 0 disables)
+    GUNICORN_TIMEOUT              seconds before a silent worker is killed (30)
+    PORT                          listening port (3000)
+
+With preload_app the master imports the app and forks the workers, so the
+SQLAlchemy pools are disposed in post_fork, before a worker can reuse a
+connection opened by its parent. gthread serves GUNICORN_THREADS requests
+per worker at once, each needs a connection, keep DB_POOL_SIZE +
+DB_MAX_OVERFLOW above it. gevent needs `pipenv install gevent` (and
+psycogreen for postgres) and patches the standard library before the app
+is imported.
+
+The defaults come from benchmarks/gunicorn_profiles.py (3 workers,
+concurrency 8, 100 requests per route, SQLite, 1 vCPU; the median over
+the routes of two runs):
+
+    profile        boot ms  memory MB  p50 ms  p95 ms  req/s
+    sync              1958        138      48      76    139
+    sync-preload       886         77      46      79    143
+    gthread (4)        965         79      38     214    105
+    gevent            1115         87      58     102    120
+
+Preloading halves the boot and the memory of the workers (the app pages
+stay shared after the fork) for the same latency, so it is on. sync
+stays the default: gthread answers the fast reads sooner but its threads
+queue on the GIL and on the database, which nearly triples p95 and costs
+a quarter of the throughput. gevent gains nothing while every request
+waits on a blocking driver. Both are worth measuring again on postgres
+with more cores.
+"""
+import multiprocessing
+import os
+import shutil
+import sys
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+if worker_class not in ('sync', 'gthread', 'gevent'):
+    raise RuntimeError(f"GUNICORN_WORKER_CLASS must be sync, gthread or gevent, not {worker_class}")
+
+if worker_class == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+    try:
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+    except ImportError:
+        pass
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 3000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+if worker_class == 'gthread':
+    threads = int(os.environ.get('GUNICORN_THREADS', 4))
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() in ('1', 'true', 'yes', 'on')
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 100))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+
+def on_starting(server):
+    # the metrics snapshots of a previous run would be added to this one's
+    from metrics import METRICS_DIR
+    shutil.rmtree(METRICS_DIR, ignore_errors=True)
+
+def worker_exit(server, worker):
+    # in the worker: publish the requests served since the last flush
+    metrics = sys.modules.get('metrics')
+    if metrics is not None:
+        metrics.flush(force=True)
+
+def child_exit(server, worker):
+    # the exited worker's metrics snapshot joins the archive (see metrics.py)
+    from metrics import archive_worker
+    archive_worker(worker.pid)
+
+def post_fork(server, worker):
+    # Only a preloaded app exists in the worker at this point. close=False
+    # leaves the parent's connections open for the parent, the worker just
+    # forgets them and opens its own.
+    app = sys.modules.get('app')
+    if app is None:
+        return
+    import metrics
+    from models import db
+    with app.app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    metrics.reset()
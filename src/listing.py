@@ -0,0 +1,225 @@
+"""
+Query string driven listing of the collection endpoints:
+
+    ?fields=id,name                 columns to select (see serializers.py)
+    ?climate=arid                   equality
+    ?population__gte=1000           range: __gt, __gte, __lt, __lte
+    ?name__prefix=Ta                prefix
+    ?sort=-population               order by a column, '-' for descending
+    ?limit=50&after=<next>          keyset pagination
+
+Only the columns declared in FILTERS and SORTS are accepted. All of them but
+User.is_active, whose two values an index would hardly narrow down, are
+indexed, so the filters and sorts are answered with an index range scan. On
+postgres the prefix filters use the *_pattern indexes (text_pattern_ops),
+the plain ones follow the database collation, which LIKE can not use.
+"""
+import base64
+import binascii
+import json
+import os
+from flask import request
+from sqlalchemy import and_, select, tuple_, union_all, Integer, Boolean
+from models import db, User, Characters, Planets, Vehicle
+from serializers import serialize_fields, select_fields, rows_to_dicts
+from utils import APIException
+
+DEFAULT_PAGE_SIZE = int(os.environ.get('DEFAULT_PAGE_SIZE', 100))
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', 1000))
+
+EQ = ('eq',)
+RANGE = ('eq', 'gt', 'gte', 'lt', 'lte')
+TEXT = ('eq', 'prefix')
+
+FILTERS = {
+    User: {'email': TEXT, 'is_active': EQ},
+    Characters: {'specie': TEXT},
+    Planets: {'name': TEXT, 'climate': TEXT, 'population': RANGE},
+    Vehicle: {'name': TEXT, 'max_speed': RANGE, 'driver_id': EQ},
+}
+
+SORTS = {
+    User: ('id', 'email'),
+    Characters: ('id', 'specie'),
+    Planets: ('id', 'name', 'climate', 'population'),
+    Vehicle: ('id', 'name', 'max_speed'),
+}
+
+RESERVED_ARGS = ('fields', 'sort', 'limit', 'after')
+
+def get_fields_arg(model):
+    # ?fields=a,b,c , only columns that serialize() exposes are allowed
+    fields = request.args.get('fields')
+    if not fields:
+        return None
+    fields = tuple(dict.fromkeys(field.strip() for field in fields.split(',')))
+    unknown = [field for field in fields if field not in serialize_fields(model)]
+    if unknown:
+        raise APIException(f"Campos desconocidos: {', '.join(unknown)}", status_code=400)
+    return fields
+
+def parse_value(column, value):
+    if isinstance(column.type, Boolean):
+        if value.lower() not in ('true', 'false'):
+            raise APIException(f"{column.key} debe ser true o false", status_code=400)
+        return value.lower() == 'true'
+    if isinstance(column.type, Integer):
+        try:
+            return int(value)
+        except ValueError:
+            raise APIException(f"{column.key} debe ser un numero entero", status_code=400)
+    return value
+
+def next_prefix(prefix):
+    # the smallest string above every string starting with prefix, in code
+    # point order, or None when there is none (a prefix of U+10FFFF only)
+    prefix = prefix.rstrip('\U0010ffff')
+    if not prefix:
+        return None
+    code = ord(prefix[-1]) + 1
+    if 0xD800 <= code <= 0xDFFF:
+        # surrogates can not be encoded, skip to the next character
+        code = 0xE000
+    return prefix[:-1] + chr(code)
+
+def prefix_clause(column, prefix):
+    if not prefix:
+        return column.is_not(None)
+    pattern = prefix.replace('/', '//').replace('%', '/%').replace('_', '/_') + '%'
+    like = column.like(pattern, escape='/')
+    if db.engine.dialect.name != 'sqlite':
+        # postgres answers a LIKE with a constant prefix from the text_pattern_ops index
+        return like
+    # sqlite only uses an index for a range, compared in code point order
+    # (the BINARY collation), the LIKE keeps the match exact
+    clauses = [column >= prefix, like]
+    upper = next_prefix(prefix)
+    if upper is not None:
+        clauses.append(column < upper)
+    return and_(*clauses)
+
+def get_filters(model):
+    clauses = []
+    allowed = FILTERS[model]
+    for key, value in request.args.items(multi=True):
+        if key in RESERVED_ARGS:
+            continue
+        name, _, operator = key.partition('__')
+        operator = operator or 'eq'
+        if operator not in allowed.get(name, ()):
+            raise APIException(f"Filtro no permitido: {key}", status_code=400)
+        column = getattr(model, name)
+        if operator == 'prefix':
+            clauses.append(prefix_clause(column, value))
+            continue
+        value = parse_value(column, value)
+        clauses.append({
+            'eq': column == value,
+            'gt': column > value,
+            'gte': column >= value,
+            'lt': column < value,
+            'lte': column <= value,
+        }[operator])
+    return clauses
+
+def get_sort(model):
+    sort = request.args.get('sort', 'id')
+    name = sort.lstrip('-')
+    if name not in SORTS[model]:
+        raise APIException(f"No se puede ordenar por {name}", status_code=400)
+    return getattr(model, name), sort.startswith('-')
+
+def get_limit():
+    # the page size is always capped by the server
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise APIException("limit debe ser un numero entero", status_code=400)
+    if limit < 1:
+        raise APIException("limit debe ser mayor que 0", status_code=400)
+    return min(limit, MAX_PAGE_SIZE)
+
+def encode_cursor(value, id):
+    return base64.urlsafe_b64encode(json.dumps([value, id]).encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        value, id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        id = int(id)
+    except (ValueError, TypeError, binascii.Error):
+        raise APIException("after no es un cursor valido", status_code=400)
+    # the value goes to the database as a bind parameter, only the scalars a
+    # sortable column holds (bool is an int, but no sort column is boolean)
+    if value is not None and (isinstance(value, bool) or not isinstance(value, (str, int, float))):
+        raise APIException("after no es un cursor valido", status_code=400)
+    return value, id
+
+def keyset_ranges(model, column, descending, after):
+    # The rows of ORDER BY column [DESC] NULLS LAST, id [DESC] after the cursor,
+    # as the where clauses of index ranges in that order. A nullable column
+    # gives two, its values and then its NULLs by id: an OR of both would make
+    # the database scan the whole index instead of seeking into it.
+    if after is None:
+        if not column.nullable:
+            return [None]
+        return [column.is_not(None), column.is_(None)]
+    value, id = after
+    if value is None:
+        return [and_(column.is_(None), model.id < id if descending else model.id > id)]
+    keys = tuple_(column, model.id)
+    values = keys < tuple_(value, id) if descending else keys > tuple_(value, id)
+    if not column.nullable:
+        return [values]
+    return [values, column.is_(None)]
+
+def page_statement(model):
+    # Keyset pagination: every page is an index range scan no matter how deep
+    # it is, unlike OFFSET which has to skip the previous rows. Sorted by id the
+    # cursor is the last id, sorted by another column it is an opaque token.
+    # Returns the statement and what page_result needs to build the page from its rows.
+    limit = get_limit()
+    fields = get_fields_arg(model) or serialize_fields(model)
+    column, descending = get_sort(model)
+    by_id = column is model.id
+    statement = select_fields(model, fields).where(*get_filters(model))
+    # the cursor columns go last, rows_to_dicts only zips the requested fields
+    statement = statement.add_columns(column, model.id)
+    after = request.args.get('after')
+
+    if by_id:
+        if after is not None:
+            try:
+                statement = statement.where(model.id < int(after) if descending else model.id > int(after))
+            except ValueError:
+                raise APIException("after debe ser un numero entero", status_code=400)
+        statement = statement.order_by(model.id.desc() if descending else model.id)
+        return statement.limit(limit + 1), (fields, limit, by_id)
+
+    ranges = keyset_ranges(model, column, descending, decode_cursor(after) if after is not None else None)
+    order_by = (column.desc(), model.id.desc()) if descending else (column, model.id)
+    id_order = model.id.desc() if descending else model.id
+    branches = []
+    for clause in ranges:
+        branch = statement if clause is None else statement.where(clause)
+        # the NULLs are equal, their range is in id order
+        nulls = clause is not None and len(ranges) > 1 and clause is ranges[-1]
+        branches.append(branch.order_by(*((id_order,) if nulls else order_by)).limit(limit + 1))
+    if len(branches) == 1:
+        return branches[0], (fields, limit, by_id)
+    # each range reads at most limit + 1 rows from its index, only those are sorted
+    union = union_all(*(select(*branch.subquery().c) for branch in branches)).subquery()
+    value, id = list(union.c)[-2:]
+    ordered = (value.desc().nulls_last(), id.desc()) if descending else (value.asc().nulls_last(), id)
+    return select(*union.c).order_by(*ordered).limit(limit + 1), (fields, limit, by_id)
+
+def page_result(rows, fields, limit, by_id):
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        value, id = rows[-1][-2:]
+        next_cursor = id if by_id else encode_cursor(value, id)
+    return rows_to_dicts(rows, fields), next_cursor
+
+def paginate(model):
+    statement, page = page_statement(model)
+    return page_result(db.session.execute(statement).all(), *page)
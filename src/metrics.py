@@ -0,0 +1,228 @@
+"""
+Per request instrumentation: number of SQL queries, time spent in the
+database and serializing, exposed as a Server-Timing header on every
+response and aggregated into per endpoint histograms for /metrics
+(Prometheus text format).
+
+Each gunicorn worker keeps its histograms in memory and writes a snapshot to
+METRICS_DIR/worker-<pid>.json at most every METRICS_FLUSH_INTERVAL seconds.
+When a worker exits the master folds its snapshot into METRICS_DIR/archive.json
+and deletes it (archive_worker, from gunicorn's child_exit), so the recycled
+workers do not leave a file each behind and the counters never go backwards.
+/metrics adds up the archive and the snapshots of the running workers, so it
+reports the same totals whichever worker answers it.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'starwars-metrics'))
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 1))
+ARCHIVE = 'archive.json'
+# ids of the last snapshots folded into the archive, see collect
+ARCHIVED_IDS_KEPT = 64
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+HISTOGRAMS = {
+    'http_request_duration_seconds': ("Request latency", SECONDS_BUCKETS),
+    'http_request_db_seconds': ("Time spent in SQL per request", SECONDS_BUCKETS),
+    'http_request_serialize_seconds': ("Time spent serializing per request", SECONDS_BUCKETS),
+    'http_request_queries': ("SQL queries per request", COUNT_BUCKETS),
+}
+
+_lock = threading.Lock()
+_file_lock = threading.Lock()
+_data = {}
+_last_flush = 0.0
+_dirty = False
+_flusher_pid = None
+_process_id = None
+
+def observe(name, labels, value):
+    global _dirty
+    buckets = HISTOGRAMS[name][1]
+    key = json.dumps(labels, sort_keys=True)
+    with _lock:
+        series = _data.setdefault(name, {}).setdefault(key, {"buckets": [0] * len(buckets), "sum": 0.0, "count": 0})
+        for index, bound in enumerate(buckets):
+            if value <= bound:
+                series["buckets"][index] += 1
+        series["sum"] += value
+        series["count"] += 1
+        _dirty = True
+    if _flusher_pid != os.getpid():
+        start_flusher()
+
+def add_timing(name, seconds):
+    # accumulates a named duration into the current request's Server-Timing
+    if has_request_context() and 'timings' in g:
+        g.timings[name] = g.timings.get(name, 0.0) + seconds
+
+def reset():
+    # forget the data inherited from the parent process after a fork
+    global _last_flush
+    with _lock:
+        _data.clear()
+    _last_flush = 0.0
+
+def start_flusher():
+    # Flushes the snapshot in the background so a worker that goes idle after
+    # a burst still publishes it within METRICS_FLUSH_INTERVAL. Started lazily
+    # by each process, threads do not survive a fork.
+    global _flusher_pid
+    with _lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+
+    def run():
+        while True:
+            time.sleep(METRICS_FLUSH_INTERVAL)
+            flush()
+
+    threading.Thread(target=run, name='metrics-flusher', daemon=True).start()
+
+def process_id():
+    # tells the snapshots apart, unlike the pid which the system reuses
+    global _process_id
+    if _process_id is None or not _process_id.startswith(f'{os.getpid()}-'):
+        _process_id = f'{os.getpid()}-{uuid.uuid4().hex[:12]}'
+    return _process_id
+
+def snapshot_path(pid):
+    return os.path.join(METRICS_DIR, f'worker-{pid}.json')
+
+def read_json(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+def write_json(path, data):
+    with open(path + '.tmp', 'w') as file:
+        file.write(data if isinstance(data, str) else json.dumps(data))
+    os.replace(path + '.tmp', path)
+
+def add_up(total, data):
+    for name, series in data.items():
+        for key, values in series.items():
+            merged = total.setdefault(name, {}).setdefault(key, {"buckets": [0] * len(values["buckets"]), "sum": 0.0, "count": 0})
+            merged["buckets"] = [a + b for a, b in zip(merged["buckets"], values["buckets"])]
+            merged["sum"] += values["sum"]
+            merged["count"] += values["count"]
+    return total
+
+def flush(force=False):
+    global _last_flush, _dirty
+    if not force and (not _dirty or time.monotonic() - _last_flush < METRICS_FLUSH_INTERVAL):
+        return
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    # the flusher thread and the requests of a threaded worker share the
+    # file, the snapshot is taken inside the lock so an older one never
+    # replaces a newer one
+    with _file_lock:
+        with _lock:
+            snapshot = json.dumps({"id": process_id(), "metrics": _data})
+            _dirty = False
+        write_json(snapshot_path(os.getpid()), snapshot)
+    _last_flush = time.monotonic()
+
+def archive_worker(pid):
+    # Runs in the gunicorn master once the worker is gone, one at a time: the
+    # archive is written before the snapshot is deleted, and remembers its id
+    path = snapshot_path(pid)
+    snapshot = read_json(path)
+    if snapshot is not None:
+        archive_path = os.path.join(METRICS_DIR, ARCHIVE)
+        archive = read_json(archive_path) or {"ids": [], "metrics": {}}
+        add_up(archive["metrics"], snapshot["metrics"])
+        archive["ids"] = (archive["ids"] + [snapshot["id"]])[-ARCHIVED_IDS_KEPT:]
+        write_json(archive_path, archive)
+    for leftover in (path, path + '.tmp'):
+        try:
+            os.remove(leftover)
+        except FileNotFoundError:
+            pass
+
+def collect():
+    flush(force=True)
+    snapshots = []
+    for filename in os.listdir(METRICS_DIR):
+        if filename.startswith('worker-') and filename.endswith('.json'):
+            snapshot = read_json(os.path.join(METRICS_DIR, filename))
+            if snapshot is not None:
+                snapshots.append(snapshot)
+    # Read after the snapshots: one archived meanwhile was either read above
+    # and is listed in the archive's ids, or is gone and already in the archive.
+    archive = read_json(os.path.join(METRICS_DIR, ARCHIVE)) or {"ids": [], "metrics": {}}
+    merged = add_up({}, archive["metrics"])
+    for snapshot in snapshots:
+        if snapshot["id"] not in archive["ids"]:
+            add_up(merged, snapshot["metrics"])
+    return merged
+
+def format_labels(labels, **extra):
+    labels = dict(labels, **extra)
+    return ",".join(f'{name}="{str(value)}"' for name, value in sorted(labels.items()))
+
+def render():
+    lines = []
+    merged = collect()
+    for name, (help, buckets) in HISTOGRAMS.items():
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} histogram")
+        for key, values in sorted(merged.get(name, {}).items()):
+            labels = json.loads(key)
+            for bound, count in zip(buckets, values["buckets"]):
+                lines.append(f"{name}_bucket{{{format_labels(labels, le=bound)}}} {count}")
+            lines.append(f"{name}_bucket{{{format_labels(labels, le='+Inf')}}} {values['count']}")
+            lines.append(f"{name}_sum{{{format_labels(labels)}}} {values['sum']}")
+            lines.append(f"{name}_count{{{format_labels(labels)}}} {values['count']}")
+    return "\n".join(lines) + "\n"
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['query_start'] = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start']
+    if has_request_context() and 'timings' in g:
+        g.queries += 1
+        g.timings['db'] = g.timings.get('db', 0.0) + elapsed
+
+def setup_metrics(app):
+
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+        g.queries = 0
+        g.timings = {}
+
+    @app.after_request
+    def record_request(response):
+        if 'request_start' not in g:
+            return response
+        total = time.perf_counter() - g.request_start
+        db_time = g.timings.get('db', 0.0)
+        serialize_time = g.timings.get('serialize', 0.0)
+        response.headers['Server-Timing'] = ", ".join([
+            f'db;dur={db_time * 1000:.2f};desc="{g.queries} queries"',
+            f'serialize;dur={serialize_time * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ])
+        labels = {"endpoint": request.endpoint or "none", "method": request.method, "status": response.status_code}
+        observe('http_request_duration_seconds', labels, total)
+        observe('http_request_db_seconds', labels, db_time)
+        observe('http_request_serialize_seconds', labels, serialize_time)
+        observe('http_request_queries', labels, g.queries)
+        return response
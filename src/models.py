@@ -1,24 +1,48 @@
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import String, Boolean, Integer, ForeignKey
+from sqlalchemy import String, Boolean, Integer, ForeignKey, Index, event
 from sqlalchemy.orm import Mapped, mapped_column, relationship
+from replica import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+
+
+def set_sqlite_foreign_keys(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+def enable_sqlite_foreign_keys(engine):
+    # sqlite only enforces foreign keys, and their ON DELETE actions, on the
+    # connections that ask for it
+    if engine.dialect.name == 'sqlite':
+        event.listen(engine, 'connect', set_sqlite_foreign_keys)
+
+def pattern_index(table, column):
+    # postgres only: a LIKE 'prefix%' can not use an index in a non C collation,
+    # this one compares characters one by one (see listing.prefix_clause)
+    return Index(f'ix_{table}_{column}_pattern', column,
+                 postgresql_ops={column: 'text_pattern_ops'}).ddl_if(dialect='postgresql')
 
 
 class User(db.Model):
     __tablename__ = 'user'
+    __table_args__ = (
+        pattern_index('user', 'email'),
+    )
     id: Mapped[int] = mapped_column(primary_key=True)
     user_name: Mapped[str] = mapped_column(String(20), nullable=False)
     email: Mapped[str] = mapped_column(
         String(120), unique=True, nullable=False)
     password: Mapped[str] = mapped_column(nullable=False)
     is_active: Mapped[bool] = mapped_column(Boolean(), nullable=False)
+    # the favorites are deleted by the database (ON DELETE CASCADE), passive_deletes
+    # keeps the ORM from loading them to delete them one by one
     favoritecha: Mapped[list['FavoriteCharacters']
-                        ] = relationship(back_populates='user')
+                        ] = relationship(back_populates='user', cascade="all, delete-orphan", passive_deletes=True)
     favoriteveh: Mapped[list['FavoriteVehicles']
-                        ] = relationship(back_populates='user', cascade="all, delete-orphan")
+                        ] = relationship(back_populates='user', cascade="all, delete-orphan", passive_deletes=True)
     favoritepla: Mapped[list['FavoritePlanets']
-                        ] = relationship(back_populates='user')
+                        ] = relationship(back_populates='user', cascade="all, delete-orphan", passive_deletes=True)
 
     def __repr__(self):
         return f'<User {self.user_name}>'
@@ -35,14 +59,21 @@ class User(db.Model):
 
 class Characters(db.Model):
     __tablename__ = 'character'
+    __table_args__ = (
+        # GET /popular: ORDER BY favorite_count DESC, id DESC is a backwards scan
+        Index('ix_character_favorite_count_id', 'favorite_count', 'id'),
+        pattern_index('character', 'specie'),
+    )
     id: Mapped[int] = mapped_column(primary_key=True)
     first_name: Mapped[str] = mapped_column(String(20), nullable=False)
     last_name: Mapped[str] = mapped_column(String(20), nullable=True)
-    specie: Mapped[str] = mapped_column(String(20), nullable=False)
+    specie: Mapped[str] = mapped_column(String(20), nullable=False, index=True)
     height: Mapped[int] = mapped_column(Integer)
+    # kept up to date by the favorite handlers, `flask popularity reconcile` repairs it
+    favorite_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default='0')
     favorite_by: Mapped[list['FavoriteCharacters']
-                        ] = relationship(back_populates='character', cascade="all, delete-orphan")
-    vehicle: Mapped[list['Vehicle']] = relationship(back_populates='driver')
+                        ] = relationship(back_populates='character', cascade="all, delete-orphan", passive_deletes=True)
+    vehicle: Mapped[list['Vehicle']] = relationship(back_populates='driver', passive_deletes=True)
 
     def __repr__(self):
         return f'<Character {self.first_name} {self.last_name}>'
@@ -59,27 +90,43 @@ class Characters(db.Model):
 
 class FavoriteCharacters(db.Model):
     __tablename__ = 'favorite_characters'
+    __table_args__ = (
+        Index('ix_favorite_characters_user_id_character_id', 'user_id', 'character_id', unique=True),
+        Index('ix_favorite_characters_character_id', 'character_id'),
+    )
     id: Mapped[int] = mapped_column(primary_key=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey('user.id'))
+    user_id: Mapped[int] = mapped_column(ForeignKey('user.id', ondelete='CASCADE'))
     user: Mapped['User'] = relationship(back_populates='favoritecha')
-    character_id: Mapped[int] = mapped_column(ForeignKey('character.id'))
+    character_id: Mapped[int] = mapped_column(ForeignKey('character.id', ondelete='CASCADE'))
     character: Mapped['Characters'] = relationship(
         back_populates='favorite_by')
 
+    def serialize(self):
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "character_id": self.character_id,
+        }
+
     def __repr__(self):
         return f'{self.user} le gusta {self.character}'
 
 
 class Vehicle(db.Model):
     __tablename__ = 'vehicle'
+    __table_args__ = (
+        Index('ix_vehicle_favorite_count_id', 'favorite_count', 'id'),
+        pattern_index('vehicle', 'name'),
+    )
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(String(50), unique=True, nullable=False)
-    max_speed: Mapped[int] = mapped_column(Integer)
+    max_speed: Mapped[int] = mapped_column(Integer, index=True)
     driver_id: Mapped[int] = mapped_column(
-        ForeignKey('character.id'), nullable=True, unique=True)
+        ForeignKey('character.id', ondelete='SET NULL'), nullable=True, unique=True)
+    favorite_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default='0')
     driver: Mapped['Characters'] = relationship(back_populates='vehicle')
     favorite_by: Mapped[list['FavoriteVehicles']
-                        ] = relationship(back_populates='vehicle', cascade="all, delete-orphan")
+                        ] = relationship(back_populates='vehicle', cascade="all, delete-orphan", passive_deletes=True)
     
     def serialize(self):
         return{
@@ -94,24 +141,41 @@ class Vehicle(db.Model):
 
 class FavoriteVehicles(db.Model):
     __tablename__ = 'favorite_vehicles'
+    __table_args__ = (
+        Index('ix_favorite_vehicles_user_id_vehicle_id', 'user_id', 'vehicle_id', unique=True),
+        Index('ix_favorite_vehicles_vehicle_id', 'vehicle_id'),
+    )
     id: Mapped[int] = mapped_column(primary_key=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey('user.id'))
+    user_id: Mapped[int] = mapped_column(ForeignKey('user.id', ondelete='CASCADE'))
     user: Mapped['User'] = relationship(back_populates='favoriteveh')
-    vehicle_id: Mapped[int] = mapped_column(ForeignKey('vehicle.id'))
+    vehicle_id: Mapped[int] = mapped_column(ForeignKey('vehicle.id', ondelete='CASCADE'))
     vehicle: Mapped['Vehicle'] = relationship(back_populates='favorite_by')
 
+    def serialize(self):
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "vehicle_id": self.vehicle_id,
+        }
+
     def __repr__(self):
         return f'{self.user} le gusta {self.vehicle}>'
 
 
 class Planets(db.Model):
     __tablename__ = 'planets'
+    __table_args__ = (
+        Index('ix_planets_favorite_count_id', 'favorite_count', 'id'),
+        pattern_index('planets', 'name'),
+        pattern_index('planets', 'climate'),
+    )
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(String(50), unique=True, nullable=False)
-    population: Mapped[int] = mapped_column(Integer)
-    climate: Mapped[str] = mapped_column(String(250), nullable=True)
+    population: Mapped[int] = mapped_column(Integer, index=True)
+    climate: Mapped[str] = mapped_column(String(250), nullable=True, index=True)
+    favorite_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default='0')
     favorite_by: Mapped[list['FavoritePlanets']
-                        ] = relationship(back_populates='planet', cascade="all, delete-orphan")
+                        ] = relationship(back_populates='planet', cascade="all, delete-orphan", passive_deletes=True)
     def serialize(self):
         return{
             "id": self.id,
@@ -126,12 +190,33 @@ class Planets(db.Model):
 
 class FavoritePlanets(db.Model):
     __tablename__ = 'favorite_planets'
+    __table_args__ = (
+        Index('ix_favorite_planets_user_id_planet_id', 'user_id', 'planet_id', unique=True),
+        Index('ix_favorite_planets_planet_id', 'planet_id'),
+    )
     id: Mapped[int] = mapped_column(primary_key=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey('user.id'))
+    user_id: Mapped[int] = mapped_column(ForeignKey('user.id', ondelete='CASCADE'))
     user: Mapped['User'] = relationship(back_populates='favoritepla')
-    planet_id: Mapped[int] = mapped_column(ForeignKey('planets.id'))
+    planet_id: Mapped[int] = mapped_column(ForeignKey('planets.id', ondelete='CASCADE'))
     planet: Mapped['Planets'] = relationship(back_populates='favorite_by')
 
 
+    def serialize(self):
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "planet_id": self.planet_id,
+        }
+
     def __repr__(self):
         return f'{self.user} le gusta {self.planet}>'
+
+
+class TableVersion(db.Model):
+    # Bumped by every write to a table, used to build the ETags of its endpoints
+    __tablename__ = 'table_version'
+    name: Mapped[str] = mapped_column(String(50), primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<TableVersion {self.name} {self.version}>'
@@ -0,0 +1,79 @@
+"""
+Read/write splitting: with DATABASE_READ_URL set, the GET, HEAD and OPTIONS
+requests read from that replica (the 'replica' bind) and every other
+request uses the primary, DATABASE_URL.
+
+A client that wrote reads from the primary for the next READ_YOUR_WRITES_WINDOW
+seconds, so it sees its own writes while the replica catches up. Choose a
+window above the usual replication lag. The write's response says until when
+twice: in a cookie, which only same-origin clients send back (SameSite=Lax,
+and CORS is enabled without credentials), and in the X-Read-Primary-Until
+header, which cross-origin clients copy into the headers of their next reads.
+
+Locally, with two SQLite files standing in for a primary and its replica
+(there is no replication between them, copy the file to "replicate"):
+
+    $ cp /tmp/test.db /tmp/replica.db
+    $ DATABASE_READ_URL=sqlite:////tmp/replica.db pipenv run start
+"""
+import math
+import os
+import time
+from flask import g, request, has_request_context
+from flask_sqlalchemy.session import Session
+
+READ_YOUR_WRITES_WINDOW = float(os.environ.get('READ_YOUR_WRITES_WINDOW', 5))
+READ_YOUR_WRITES_COOKIE = 'read_primary_until'
+READ_YOUR_WRITES_HEADER = 'X-Read-Primary-Until'
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+REPLICA = 'replica'
+
+def replica_url():
+    read_url = os.getenv("DATABASE_READ_URL")
+    return read_url.replace("postgres://", "postgresql://") if read_url else None
+
+def reads_from_replica():
+    return has_request_context() and g.get('read_replica', False)
+
+def pinned_to_primary():
+    # a read sent to the primary because the client wrote recently
+    return has_request_context() and g.get('read_your_writes', False)
+
+class RoutingSession(Session):
+    # the models all live on the primary (no __bind_key__), reads of the
+    # requests routed to the replica are sent to the same tables there
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and reads_from_replica():
+            engine = self._db.engines.get(REPLICA)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+def setup_replica(app):
+    if REPLICA not in app.config.get('SQLALCHEMY_BINDS', {}):
+        return
+
+    def pinned(value):
+        # a time in the window, give or take the clock differences between
+        # servers: a client can not stay on the primary by sending a later one
+        try:
+            return time.time() < float(value) <= time.time() + 2 * READ_YOUR_WRITES_WINDOW
+        except (TypeError, ValueError):
+            return False
+
+    @app.before_request
+    def choose_database():
+        if request.method not in READ_METHODS:
+            return
+        g.read_your_writes = (pinned(request.cookies.get(READ_YOUR_WRITES_COOKIE))
+                              or pinned(request.headers.get(READ_YOUR_WRITES_HEADER)))
+        g.read_replica = not g.read_your_writes
+
+    @app.after_request
+    def stick_to_primary(response):
+        if request.method not in READ_METHODS:
+            until = str(round(time.time() + READ_YOUR_WRITES_WINDOW, 3))
+            response.set_cookie(READ_YOUR_WRITES_COOKIE, until,
+                                max_age=math.ceil(READ_YOUR_WRITES_WINDOW), httponly=True, samesite='Lax')
+            response.headers[READ_YOUR_WRITES_HEADER] = until
+        return response
@@ -0,0 +1,141 @@
+"""
+Full text search across characters, planets and vehicles.
+
+On sqlite the documents live in the FTS5 table search_index, kept in sync by
+triggers on each table (see the c2b8e4f1a9d7 and a9e4d2b7c6f3 migrations).
+The rowid of a document is <entity id> * 4 + <entity code>, so a trigger can
+replace or delete it with a rowid lookup. The update triggers only fire for
+the SEARCHED_COLUMNS, not for the favorite_count bumps. On postgres every table has a GIN index on
+the tsvector of its searchable columns and the three are queried together.
+
+Results of all the types are ranked together; a lower rank is a better match.
+"""
+import re
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from models import db, Characters, Planets, Vehicle
+from serializers import serialize_fields, select_fields
+from utils import APIException
+
+# type: (model, code, searchable text, {row} is the trigger row prefix)
+DOCUMENTS = {
+    'people': (Characters, 1, "{row}first_name || ' ' || coalesce({row}last_name, '') || ' ' || {row}specie"),
+    'planets': (Planets, 2, "{row}name || ' ' || coalesce({row}climate, '')"),
+    'vehicles': (Vehicle, 3, "{row}name"),
+}
+TYPES = {code: name for name, (_, code, _) in DOCUMENTS.items()}
+# the columns of each document, and id which its rowid is built from
+SEARCHED_COLUMNS = {
+    'people': ('id', 'first_name', 'last_name', 'specie'),
+    'planets': ('id', 'name', 'climate'),
+    'vehicles': ('id', 'name'),
+}
+
+WORD = re.compile(r'\w+', re.UNICODE)
+
+def sqlite_ddl():
+    statements = ["CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(body, tokenize='unicode61 remove_diacritics 2')"]
+    for name, (model, code, body) in DOCUMENTS.items():
+        table = model.__tablename__
+        columns = ", ".join(SEARCHED_COLUMNS[name])
+        insert = f"INSERT INTO search_index(rowid, body) VALUES (new.id * 4 + {code}, {body.format(row='new.')});"
+        delete = f"DELETE FROM search_index WHERE rowid = old.id * 4 + {code};"
+        statements += [
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_insert AFTER INSERT ON {table} BEGIN {insert} END",
+            # replaced, a database created before it was scoped to the columns has the old one
+            f"DROP TRIGGER IF EXISTS {table}_search_update",
+            f"CREATE TRIGGER {table}_search_update AFTER UPDATE OF {columns} ON {table} BEGIN {delete} {insert} END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_delete AFTER DELETE ON {table} BEGIN {delete} END",
+        ]
+    return statements
+
+def postgres_ddl():
+    return [
+        f"CREATE INDEX IF NOT EXISTS ix_{model.__tablename__}_search ON \"{model.__tablename__}\" "
+        f"USING gin (to_tsvector('simple', {body.format(row='')}))"
+        for model, _, body in DOCUMENTS.values()
+    ]
+
+def rebuild_index():
+    # creates the index if it is missing (databases made with create_all) and
+    # repopulates it from the tables
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        for statement in sqlite_ddl():
+            db.session.execute(text(statement))
+        db.session.execute(text("DELETE FROM search_index"))
+        for model, code, body in DOCUMENTS.values():
+            db.session.execute(text(
+                f"INSERT INTO search_index(rowid, body) SELECT id * 4 + {code}, {body.format(row='')} FROM {model.__tablename__}"))
+    elif dialect == 'postgresql':
+        for statement in postgres_ddl():
+            db.session.execute(text(statement))
+    db.session.commit()
+
+def sqlite_query(words, limit, after):
+    match = " ".join('"' + word + '"*' for word in words)
+    statement = "SELECT rank, rowid FROM search_index WHERE search_index MATCH :match"
+    params = {"match": match, "limit": limit}
+    if after is not None:
+        statement += " AND (rank > :rank OR (rank = :rank AND rowid > :key))"
+        params.update(rank=after[0], key=after[1])
+    statement += " ORDER BY rank, rowid LIMIT :limit"
+    try:
+        return db.session.execute(text(statement), params).all()
+    except OperationalError as e:
+        # a database made with create_all has no search_index until it is built
+        if 'no such table: search_index' not in str(e.orig):
+            raise
+        db.session.rollback()
+        raise APIException("La busqueda no esta disponible, cree el indice con flask search-index", status_code=503)
+
+def postgres_query(words, limit, after):
+    parts = []
+    for model, code, body in DOCUMENTS.values():
+        vector = f"to_tsvector('simple', {body.format(row='')})"
+        parts.append(
+            f"SELECT -ts_rank({vector}, query) AS rank, id * 4 + {code} AS key "
+            f"FROM \"{model.__tablename__}\", query WHERE {vector} @@ query")
+    statement = (
+        "WITH query AS (SELECT to_tsquery('simple', :match) AS query) "
+        f"SELECT rank, key FROM ({' UNION ALL '.join(parts)}) AS documents")
+    params = {"match": " & ".join(word + ":*" for word in words), "limit": limit}
+    if after is not None:
+        statement += " WHERE (rank, key) > (:rank, :key)"
+        params.update(rank=after[0], key=after[1])
+    statement += " ORDER BY rank, key LIMIT :limit"
+    return db.session.execute(text(statement), params).all()
+
+def search(q, limit, after=None):
+    # Returns the page of results [{type, id, rank, item}] and the (rank, key)
+    # of its last result to continue from, or None when there are no more
+    words = [word.lower() for word in WORD.findall(q)]
+    if not words:
+        return [], None
+    if db.engine.dialect.name == 'postgresql':
+        hits = postgres_query(words, limit + 1, after)
+    else:
+        hits = sqlite_query(words, limit + 1, after)
+    next_cursor = None
+    if len(hits) > limit:
+        hits = hits[:limit]
+        next_cursor = tuple(hits[-1])
+
+    # one query per type to load the serialized items
+    ids = {}
+    for rank, key in hits:
+        ids.setdefault(TYPES[key % 4], []).append(key // 4)
+    items = {}
+    for name, type_ids in ids.items():
+        model = DOCUMENTS[name][0]
+        fields = serialize_fields(model)
+        statement = select_fields(model, fields).add_columns(model.id).where(model.id.in_(type_ids))
+        for row in db.session.execute(statement):
+            items[(name, row[-1])] = dict(zip(fields, row))
+
+    results = []
+    for rank, key in hits:
+        name, id = TYPES[key % 4], key // 4
+        if (name, id) in items:
+            results.append({"type": name, "id": id, "rank": rank, "item": items[(name, id)]})
+    return results, next_cursor
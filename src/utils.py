@@ -1,4 +1,14 @@
-from flask import jsonify, url_for
+import hmac
+import os
+from functools import wraps
+from flask import jsonify, url_for, request, current_app
+from sqlalchemy import insert
+from sqlalchemy.exc import DBAPIError, OperationalError
+from models import db
+from versioning import bump_version
+
+BULK_MAX_ITEMS = int(os.environ.get('BULK_MAX_ITEMS', 5000))
+BULK_CHUNK_SIZE = int(os.environ.get('BULK_CHUNK_SIZE', 500))
 
 class APIException(Exception):
     status_code = 400
@@ -15,17 +25,98 @@ class APIException(Exception):
         rv['message'] = self.message
         return rv
 
+def internal(view):
+    # The operational endpoints (pool, cache, metrics) answer only to the
+    # INTERNAL_TOKEN bearer token and do not exist when no token is set
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = current_app.config.get('INTERNAL_TOKEN')
+        if not token:
+            return jsonify({"msg": "No encontrado"}), 404
+        authorization = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode()):
+            return jsonify({"msg": "Token invalido"}), 401
+        return view(*args, **kwargs)
+    wrapper.internal = True
+    return wrapper
+
+def row_error(error):
+    # a row the database rejected (constraint, value the column can not hold,
+    # type the driver can not bind), not a connection or lock problem
+    return not error.connection_invalidated and not isinstance(error, OperationalError)
+
+def insert_rows(model, rows, chunk_size=BULK_CHUNK_SIZE):
+    # rows is a list of (key, values). Inserts them in executemany chunks, a chunk
+    # rejected by the database is retried row by row so only the offending rows fail.
+    # Returns the (key, id) of the created rows and the (key, message) of the failed ones.
+    created = []
+    failed = []
+    statement = insert(model).returning(model.id, sort_by_parameter_order=True)
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        try:
+            with db.session.begin_nested():
+                ids = db.session.scalars(statement, [values for _, values in chunk]).all()
+            created.extend((key, id) for (key, _), id in zip(chunk, ids))
+        except DBAPIError as e:
+            if not row_error(e):
+                raise
+            for key, values in chunk:
+                try:
+                    with db.session.begin_nested():
+                        id = db.session.scalars(statement, [values]).one()
+                    created.append((key, id))
+                except DBAPIError as e:
+                    if not row_error(e):
+                        raise
+                    failed.append((key, str(e.orig)))
+    return created, failed
+
+def bulk_insert(model, items, validate, values):
+    # Validates every item, then inserts the valid ones with insert_rows
+    # inside a single transaction, reporting the errors per item.
+    if len(items) > BULK_MAX_ITEMS:
+        return jsonify({"msg":f"No se pueden crear mas de {BULK_MAX_ITEMS} elementos por request"}), 400
+    errors = []
+    rows = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append({"index": index, "msg": "Cada elemento debe ser un objeto"})
+            continue
+        error = validate(item)
+        if error is not None:
+            errors.append({"index": index, "msg": error})
+            continue
+        rows.append((index, values(item)))
+
+    created, failed = insert_rows(model, rows)
+    created = [{"index": index, "id": id} for index, id in created]
+    errors.extend({"index": index, "msg": msg} for index, msg in failed)
+    if created:
+        bump_version(model)
+    db.session.commit()
+
+    errors.sort(key=lambda error: error["index"])
+    if not errors:
+        status_code = 201
+    elif created:
+        status_code = 207
+    else:
+        status_code = 400
+    return jsonify({"created": created, "errors": errors}), status_code
+
 def has_no_empty_params(rule):
     defaults = rule.defaults if rule.defaults is not None else ()
     arguments = rule.arguments if rule.arguments is not None else ()
     return len(defaults) >= len(arguments)
 
 def generate_sitemap(app):
-    links = ['/admin/']
+    links = ['/admin/'] if 'admin' in app.blueprints else []
     for rule in app.url_map.iter_rules():
         # Filter out rules we can't navigate to in a browser
         # and rules that require parameters
-        if "GET" in rule.methods and has_no_empty_params(rule):
+        if "GET" in rule.methods and has_no_empty_params(rule) \
+                and not getattr(app.view_functions[rule.endpoint], 'internal', False):
             url = url_for(rule.endpoint, **(rule.defaults or {}))
             if "/admin/" not in url:
                 links.append(url)
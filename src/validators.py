@@ -0,0 +1,41 @@
+"""
+Required-field rules shared by the single and bulk create endpoints
+"""
+
+def validate_character(body):
+    if 'first_name' not in body:
+        return "El nombre es necesario"
+    if 'specie' not in body:
+        return "La especie es necesaria"
+    return None
+
+def validate_planet(body):
+    if 'name' not in body:
+        return "El nombre es necesario"
+    return None
+
+def validate_vehicle(body):
+    if 'name' not in body:
+        return "El nombre es necesario"
+    return None
+
+def character_values(body):
+    return {
+        "first_name": body['first_name'],
+        "last_name": body.get('last_name'),
+        "specie": body['specie'],
+        "height": body.get('height'),
+    }
+
+def planet_values(body):
+    return {
+        "name": body['name'],
+        "population": body.get('population'),
+        "climate": body.get('climate'),
+    }
+
+def vehicle_values(body):
+    return {
+        "name": body['name'],
+        "max_speed": body.get('max_speed'),
+    }
@@ -0,0 +1,101 @@
+"""
+Per-table version counters and the ETag / If-None-Match handling built on them.
+
+Every flush that adds, changes or deletes an instance of VERSIONED_MODELS
+bumps the version of its tables in the same transaction, whatever session
+it goes through (the API handlers, /batch, flask-admin, the commands), so
+the counter lives in the database and is shared by all the gunicorn workers.
+Core INSERT/UPDATE/DELETE statements bypass the flush, the code running them
+calls bump_version itself.
+
+A GET whose If-None-Match matches the current version answers 304 after a
+single primary key lookup, without running the view.
+"""
+import hashlib
+from functools import wraps
+from itertools import chain
+from flask import request, current_app
+from sqlalchemy import event, select, update, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from models import db, TableVersion, User, Characters, Planets, Vehicle
+
+table_version = TableVersion.__table__
+VERSIONED_MODELS = (User, Characters, Planets, Vehicle)
+
+def get_version(model):
+    version = db.session.execute(
+        select(table_version.c.version).where(table_version.c.name == model.__tablename__)).scalar()
+    return version or 0
+
+def get_versions():
+    return dict(db.session.execute(select(table_version.c.name, table_version.c.version)).all())
+
+def bump_version(*models, session=None):
+    session = session or db.session
+    for model in models:
+        name = model.__tablename__
+        result = session.execute(
+            update(table_version).where(table_version.c.name == name).values(version=table_version.c.version + 1))
+        if result.rowcount == 0:
+            try:
+                with session.begin_nested():
+                    session.execute(insert(table_version).values(name=name, version=1))
+            except IntegrityError:
+                # another transaction created the row first
+                session.execute(
+                    update(table_version).where(table_version.c.name == name).values(version=table_version.c.version + 1))
+
+def flushed_instances(session):
+    # the versioned instances of a flush: added, deleted, or with a column that changed
+    for instance in chain(session.new, session.deleted, session.dirty):
+        if isinstance(instance, VERSIONED_MODELS) and (
+                instance not in session.dirty or session.is_modified(instance, include_collections=False)):
+            yield instance
+
+@event.listens_for(Session, 'after_flush')
+def bump_flushed_versions(session, flush_context):
+    # new, dirty and deleted still hold the flushed instances here. One
+    # table order for every transaction, two never wait on each other's rows.
+    # The entity keys wait in session.info for the commit (see cache.py).
+    instances = list(flushed_instances(session))
+    if not instances:
+        return
+    models = {type(instance) for instance in instances}
+    bump_version(*sorted(models, key=lambda model: model.__tablename__), session=session)
+    session.info.setdefault('flushed_entities', set()).update(
+        (type(instance).__tablename__, instance.id) for instance in instances)
+
+def make_etag(model, version=None):
+    # the same version serves different bodies depending on the path and the query string
+    if version is None:
+        version = get_version(model)
+    url_hash = hashlib.blake2s(request.full_path.encode(), digest_size=8).hexdigest()
+    return f'{model.__tablename__}-{version}-{url_hash}'
+
+def matching_etag(etag):
+    # the tag of If-None-Match naming this version: the ETag itself or the
+    # ETag of one of its compressed encodings, "<etag>-<encoding>" (see compression.py)
+    if request.if_none_match.star_tag:
+        return etag
+    for tag in request.if_none_match:
+        if tag == etag or tag.startswith(etag + '-'):
+            return tag
+    return None
+
+def conditional(model):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            etag = make_etag(model)
+            matched = matching_etag(etag)
+            if matched is not None:
+                response = current_app.response_class(status=304)
+                response.set_etag(matched)
+                return response
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag)
+            return response
+        return wrapper
+    return decorator
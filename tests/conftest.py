@@ -0,0 +1,71 @@
+"""
+Fixtures of the test suite: the app on a temporary SQLite database, created
+from the models (plus the search index) before every test and dropped after.
+
+    $ python -m pytest
+"""
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+fd, DB_PATH = tempfile.mkstemp(suffix='.db')
+os.close(fd)
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+os.environ['METRICS_DIR'] = tempfile.mkdtemp()
+os.environ['ENTITY_CACHE_SYNC_INTERVAL'] = '0'
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+from sqlalchemy import event, text  # noqa: E402
+import cache  # noqa: E402
+from app import app as flask_app  # noqa: E402
+from models import db  # noqa: E402
+from search import rebuild_index  # noqa: E402
+
+def clear_caches():
+    cache.entity_cache.delete_where(lambda key: True)
+    cache._versions.clear()
+    cache._last_sync = 0.0
+
+@pytest.fixture
+def app():
+    with flask_app.app_context():
+        db.create_all()
+        rebuild_index()
+    clear_caches()
+    yield flask_app
+    with flask_app.app_context():
+        db.session.remove()
+        db.drop_all()
+        db.session.execute(text("DROP TABLE IF EXISTS search_index"))
+        db.session.commit()
+    clear_caches()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def session(app):
+    with app.app_context():
+        yield db.session
+
+@pytest.fixture
+def queries(app):
+    # with queries() as statements: the SQL run by the engine inside the block
+    @contextmanager
+    def record():
+        statements = []
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return record
@@ -0,0 +1,59 @@
+import pytest
+import cache
+from sqlalchemy import select
+from models import User, Characters, Planets, Vehicle, FavoriteCharacters, FavoritePlanets, FavoriteVehicles
+
+FAVORITE_VIEWS = [
+    ('favoritecharacters', 'character', Characters, FavoriteCharacters),
+    ('favoriteplanets', 'planet', Planets, FavoritePlanets),
+    ('favoritevehicles', 'vehicle', Vehicle, FavoriteVehicles),
+]
+
+@pytest.fixture
+def entities(session):
+    session.add(User(id=1, user_name="luke", email="luke@example.com", password="x", is_active=True))
+    for id in (1, 2):
+        session.add_all([Characters(id=id, first_name=f"Character {id}", specie="Human", height=170),
+                         Planets(id=id, name=f"Planet {id}", population=id),
+                         Vehicle(id=id, name=f"Vehicle {id}", max_speed=id, driver_id=id)])
+    session.commit()
+
+def favorite_counts(session, model):
+    session.expire_all()
+    return dict(session.execute(select(model.id, model.favorite_count).order_by(model.id)).all())
+
+@pytest.mark.parametrize('endpoint, field, model, favorite', FAVORITE_VIEWS)
+def test_admin_favorites_move_the_favorite_count(client, session, entities, endpoint, field, model, favorite):
+    client.post(f'/admin/{endpoint}/new/', data={'user': '1', field: '1'})
+    assert favorite_counts(session, model) == {1: 1, 2: 0}
+    # a duplicate fails and leaves the count alone
+    client.post(f'/admin/{endpoint}/new/', data={'user': '1', field: '1'})
+    assert favorite_counts(session, model) == {1: 1, 2: 0}
+
+    id = session.scalar(select(favorite.id))
+    client.post(f'/admin/{endpoint}/edit/?id={id}', data={'user': '1', field: '2'})
+    assert favorite_counts(session, model) == {1: 0, 2: 1}
+
+    client.post(f'/admin/{endpoint}/delete/', data={'id': str(id)})
+    assert session.scalar(select(favorite.id)) is None
+    assert favorite_counts(session, model) == {1: 0, 2: 0}
+
+def test_admin_user_delete_forgets_the_favorites(client, session, entities):
+    for path, body in (('people', {"character_id": 1}), ('planets', {"planet_id": 1}), ('vehicles', {"vehicle_id": 1})):
+        assert client.post(f'/user/1/favorites/{path}', json=body).status_code == 201
+    client.post('/admin/user/delete/', data={'id': '1'})
+    assert session.get(User, 1) is None
+    for model in (Characters, Planets, Vehicle):
+        assert favorite_counts(session, model) == {1: 0, 2: 0}
+
+def test_admin_character_delete_drops_the_cached_vehicles(client, session, entities, monkeypatch):
+    # no polling of the versions, only the delete can drop the vehicle
+    monkeypatch.setattr(cache, 'ENTITY_CACHE_SYNC_INTERVAL', 3600)
+    response = client.get('/vehicles/1')
+    assert response.json['driver_id'] == 1
+    etag = response.headers['ETag']
+
+    client.post('/admin/characters/delete/', data={'id': '1'})
+    assert session.get(Characters, 1) is None
+    assert client.get('/vehicles/1', headers={'If-None-Match': etag}).status_code == 200
+    assert client.get('/vehicles/1').json['driver_id'] is None
@@ -0,0 +1,62 @@
+import sqlite3
+import pytest
+from sqlalchemy import event, select
+import utils
+from models import db, Planets
+
+@pytest.fixture
+def tatooine(session):
+    session.add(Planets(id=1, name="Tatooine", population=200000))
+    session.commit()
+
+def planet_names(session):
+    session.expire_all()
+    return session.scalars(select(Planets.name).order_by(Planets.id)).all()
+
+def test_all_created(client, session):
+    response = client.post('/planets/bulk', json=[{"name": "Hoth", "population": 0}, {"name": "Endor", "population": 30}])
+    assert response.status_code == 201
+    assert [item['index'] for item in response.json['created']] == [0, 1]
+    assert response.json['errors'] == []
+    assert planet_names(session) == ["Hoth", "Endor"]
+
+@pytest.mark.parametrize('chunk_size', [1, 500])
+def test_some_created(client, session, tatooine, monkeypatch, chunk_size):
+    # 1: every row is its own chunk, 500: one chunk retried row by row
+    monkeypatch.setattr(utils.insert_rows, '__defaults__', (chunk_size,))
+    response = client.post('/planets/bulk', json=[
+        {"name": "Hoth", "population": 0},
+        {"name": "Tatooine", "population": 1},        # unique name
+        {"population": 1},                            # no name
+        {"name": {"a": 1}, "population": 1},          # a type the driver can not bind
+        "Naboo",
+        {"name": "Endor", "population": 30},
+    ])
+    assert response.status_code == 207
+    assert [item['index'] for item in response.json['created']] == [0, 5]
+    assert [error['index'] for error in response.json['errors']] == [1, 2, 3, 4]
+    assert planet_names(session) == ["Tatooine", "Hoth", "Endor"]
+
+def test_none_created(client, session, tatooine):
+    response = client.post('/planets/bulk', json=[{"name": "Tatooine", "population": 1}, {"population": 1}])
+    assert response.status_code == 400
+    assert response.json['created'] == []
+    assert [error['index'] for error in response.json['errors']] == [0, 1]
+    assert planet_names(session) == ["Tatooine"]
+
+def test_value_too_big_for_the_column_is_an_item_error(app, client, session):
+    # what postgres answers a string longer than the varchar with: a DataError
+    with app.app_context():
+        engine = db.engine
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        dbapi_connection.setlimit(sqlite3.SQLITE_LIMIT_LENGTH, 1000)
+    event.listen(engine, 'checkout', checkout)
+    try:
+        response = client.post('/planets/bulk', json=[{"name": "Hoth", "population": 0}, {"name": "x" * 2000, "population": 1}])
+    finally:
+        event.remove(engine, 'checkout', checkout)
+        engine.dispose()
+    assert response.status_code == 207, response.json
+    assert [item['index'] for item in response.json['created']] == [0]
+    assert response.json['errors'] == [{"index": 1, "msg": "string or blob too big"}]
+    assert planet_names(session) == ["Hoth"]
@@ -0,0 +1,39 @@
+import cache
+from sqlalchemy import update
+from models import db, Planets
+from versioning import bump_version
+
+def add_planet(session):
+    session.add(Planets(id=2, name="Alderaan", population=2000000000, climate="temperate"))
+    session.commit()
+
+def test_admin_edit_drops_the_cached_entity(client, session, monkeypatch):
+    # no polling of the versions, only the commit can drop the entry
+    monkeypatch.setattr(cache, 'ENTITY_CACHE_SYNC_INTERVAL', 3600)
+    add_planet(session)
+    assert client.get('/planets/2').json['name'] == "Alderaan"
+    assert ('planets', 2) in cache.entity_cache._data
+
+    client.post('/admin/planets/edit/?id=2', data={
+        'name': "Alderaan II", 'population': '2000000000', 'climate': "temperate"})
+    assert ('planets', 2) not in cache.entity_cache._data
+    assert client.get('/planets/2').json['name'] == "Alderaan II"
+
+def test_other_worker_write_drops_the_cached_entity(client, session):
+    add_planet(session)
+    assert client.get('/planets/2').json['name'] == "Alderaan"
+    # another worker's write: only the table version tells this one
+    session.execute(update(Planets).where(Planets.id == 2).values(name="Alderaan II"))
+    bump_version(Planets)
+    session.commit()
+    assert client.get('/planets/2').json['name'] == "Alderaan II"
+
+def test_rolled_back_flush_drops_the_entity_cached_meanwhile(client, session):
+    add_planet(session)
+    planet = db.session.get(Planets, 2)
+    planet.name = "Alderaan II"
+    session.flush()
+    cache.get_entity(Planets, 2)
+    session.rollback()
+    assert ('planets', 2) not in cache.entity_cache._data
+    assert client.get('/planets/2').json['name'] == "Alderaan"
@@ -0,0 +1,68 @@
+from sqlalchemy import text
+from models import User, Characters, Planets, Vehicle, FavoriteCharacters, FavoritePlanets, FavoriteVehicles
+
+def add_user_with_favorites(session, user_id, count):
+    session.add(User(id=user_id, user_name=f"user{user_id}", email=f"user{user_id}@example.com", password="x", is_active=True))
+    for i in range(count):
+        character = Characters(first_name=f"Character {user_id}-{i}", specie="Human", height=170)
+        planet = Planets(name=f"Planet {user_id}-{i}", population=i)
+        vehicle = Vehicle(name=f"Vehicle {user_id}-{i}", max_speed=i)
+        session.add_all([character, planet, vehicle])
+        session.flush()
+        session.add_all([
+            FavoriteCharacters(user_id=user_id, character_id=character.id),
+            FavoritePlanets(user_id=user_id, planet_id=planet.id),
+            FavoriteVehicles(user_id=user_id, vehicle_id=vehicle.id),
+        ])
+    session.commit()
+
+def test_user_favorites_query_count_does_not_grow_with_favorites(client, session, queries):
+    add_user_with_favorites(session, 1, 1)
+    add_user_with_favorites(session, 2, 50)
+
+    with queries() as one:
+        response = client.get('/user/1/favorites')
+    assert response.status_code == 200
+    assert len(response.json['favorite_characters']) == 1
+
+    with queries() as many:
+        response = client.get('/user/2/favorites')
+    assert response.status_code == 200
+    assert len(response.json['favorite_characters']) == 50
+    assert len(response.json['favorite_planets']) == 50
+    assert len(response.json['favorite_vehicles']) == 50
+
+    assert len(one) == len(many) == 4
+
+def test_user_favorites_of_missing_user(client):
+    response = client.get('/user/99/favorites')
+    assert response.status_code == 404
+
+def test_add_favorite_twice_is_not_an_error(client, session):
+    add_user_with_favorites(session, 1, 0)
+    session.add(Planets(id=1, name="Tatooine", population=200000))
+    session.commit()
+    assert client.post('/user/1/favorites/planets', json={"planet_id": 1}).status_code == 201
+    response = client.post('/user/1/favorites/planets', json={"planet_id": 1})
+    assert response.status_code == 200
+    assert response.json['msg'] == "Planeta Tatooine ya esta en favoritos"
+
+def test_add_favorite_of_target_deleted_after_it_was_cached(client, session):
+    add_user_with_favorites(session, 1, 0)
+    session.add_all([Characters(id=1, first_name="Luke", specie="Human", height=172), Planets(id=1, name="Tatooine", population=200000),
+                     Vehicle(id=1, name="X-wing", max_speed=1050)])
+    session.commit()
+    for path in ('/people/1', '/planets/1', '/vehicles/1'):
+        assert client.get(path).status_code == 200
+    # deleted by another worker: the rows stay in this worker's entity cache
+    session.execute(text("DELETE FROM character"))
+    session.execute(text("DELETE FROM planets"))
+    session.execute(text("DELETE FROM vehicle"))
+    session.commit()
+
+    for path, key, message in (('people', 'character_id', "El Personaje con id 1 no existe"),
+                               ('planets', 'planet_id', "El Planeta con ID 1 no existe"),
+                               ('vehicles', 'vehicle_id', "El Vehiculo con id 1 no existe")):
+        response = client.post(f'/user/1/favorites/{path}', json={key: 1})
+        assert response.status_code == 404
+        assert response.json['msg'] == message
@@ -0,0 +1,59 @@
+import pytest
+from sqlalchemy import create_engine, text
+from app import create_app
+from dbpool import engine_options, pool_status
+from models import db
+from replica import REPLICA
+
+PATHS = ['/_internal/cache', '/_internal/pool', '/metrics']
+
+@pytest.fixture
+def token(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'INTERNAL_TOKEN', 's3cret')
+    return {'Authorization': 'Bearer s3cret'}
+
+@pytest.mark.parametrize('path', PATHS)
+def test_internal_endpoints_do_not_exist_without_a_token(client, path):
+    assert client.get(path).status_code == 404
+
+@pytest.mark.parametrize('path', PATHS)
+def test_internal_endpoints_need_the_token(client, token, path):
+    assert client.get(path).status_code == 401
+    assert client.get(path, headers={'Authorization': 'Bearer nope'}).status_code == 401
+    assert client.get(path, headers=token).status_code == 200
+
+def test_sitemap_does_not_link_the_internal_endpoints(client, token):
+    page = client.get('/').get_data(as_text=True)
+    assert '/planets' in page
+    assert not any(path in page for path in PATHS)
+
+def test_every_pool_counts_its_own_checkouts(tmp_path):
+    primary, replica = (create_engine(f"sqlite:///{tmp_path / name}", **engine_options(f"sqlite:///{tmp_path / name}"))
+                        for name in ('primary.db', 'replica.db'))
+    for _ in range(3):
+        with replica.connect() as connection:
+            connection.execute(text("SELECT 1"))
+    assert pool_status(primary)['checkouts'] == 0
+    assert pool_status(replica)['checkouts'] == 3
+    primary.dispose()
+    replica.dispose()
+
+def test_pool_status_per_bind(app, tmp_path):
+    url = f"sqlite:///{tmp_path / 'replica.db'}"
+    replica_app = create_app({'ENABLE_ADMIN': False, 'INTERNAL_TOKEN': 's3cret',
+                              'SQLALCHEMY_BINDS': {REPLICA: dict(engine_options(url), url=url)}})
+    try:
+        with replica_app.app_context():
+            db.metadata.create_all(db.engines[REPLICA])
+        client = replica_app.test_client()
+        headers = {'Authorization': 'Bearer s3cret'}
+        before = client.get('/_internal/pool', headers=headers).json
+        assert set(before) == {'primary', REPLICA}
+        # a read on the replica is counted on the replica only
+        assert client.get('/planets').status_code == 200
+        after = client.get('/_internal/pool', headers=headers).json
+        assert after[REPLICA]['checkouts'] == before[REPLICA]['checkouts'] + 1
+        assert after['primary']['checkouts'] == before['primary']['checkouts']
+    finally:
+        # init_app registered a metadata for the bind on the shared db
+        db.metadatas.pop(REPLICA, None)
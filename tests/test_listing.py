@@ -0,0 +1,104 @@
+import pytest
+from sqlalchemy import text
+from listing import page_statement, encode_cursor, next_prefix
+from models import db, Characters, Planets, Vehicle
+
+CLIMATES = ["arid", None, "temperate", "arid", None, "frozen", "temperate", None, "murky"]
+
+@pytest.fixture
+def planets(session):
+    session.add_all(Planets(id=id, name=f"Planet {id}", population=id * 10, climate=climate)
+                    for id, climate in enumerate(CLIMATES, 1))
+    session.commit()
+
+def pages(client, path):
+    # every page of path, following the cursors
+    rows = []
+    after = None
+    while True:
+        response = client.get(path + (f'&after={after}' if after is not None else ''))
+        assert response.status_code == 200
+        rows += response.json['data']
+        after = response.json['next']
+        if after is None:
+            return rows
+
+@pytest.mark.parametrize('descending', [False, True])
+def test_sort_by_nullable_column_pages_through_values_then_nulls(client, planets, descending):
+    rows = pages(client, f"/planets?sort={'-' if descending else ''}climate&limit=2")
+    values = sorted(((climate, id) for id, climate in enumerate(CLIMATES, 1) if climate is not None),
+                    reverse=descending)
+    nulls = sorted((id for id, climate in enumerate(CLIMATES, 1) if climate is None), reverse=descending)
+    assert [row['id'] for row in rows] == [id for _, id in values] + nulls
+
+def test_sort_by_nullable_column_with_filter(client, planets):
+    rows = pages(client, "/planets?sort=climate&climate__prefix=&limit=1")
+    assert [row['climate'] for row in rows] == ["arid", "arid", "frozen", "murky", "temperate", "temperate"]
+
+def test_filters(client, planets):
+    assert [row['id'] for row in pages(client, "/planets?climate=arid&limit=1")] == [1, 4]
+    assert [row['id'] for row in pages(client, "/planets?population__gte=30&population__lt=60")] == [3, 4, 5]
+    assert [row['name'] for row in pages(client, "/planets?name__prefix=Planet%201")] == ["Planet 1"]
+
+@pytest.mark.parametrize('path', ["/planets?sort=nope", "/planets?nope=1", "/planets?population=many",
+                                  "/planets?sort=climate&after=nope",
+                                  f"/planets?sort=climate&after={encode_cursor([1], 2)}",
+                                  f"/planets?sort=climate&after={encode_cursor({'a': 1}, 2)}",
+                                  f"/planets?sort=population&after={encode_cursor(True, 2)}",
+                                  f"/planets?sort=population&after={encode_cursor(1, [2])}"])
+def test_bad_arguments(client, planets, path):
+    response = client.get(path)
+    assert response.status_code == 400, response.json
+
+@pytest.mark.parametrize('prefix, expected', [
+    ("Z", ["Zeltros", "Zolan"]),
+    ("Zolan", ["Zolan"]),
+    ("Rz", ["Rzz", "Rzzz"]),
+    ("Rzz", ["Rzz", "Rzzz"]),
+    ("R9", ["R99"]),
+    ("100%", ["100% Mon Cala"]),
+    ("R_", []),
+    ("\U0010ffff", ["\U0010ffff\U0010ffff"]),
+    ("Naboo\ud7ff", ["Naboo\ud7ff\ue000"]),
+])
+def test_prefix_filter(client, session, prefix, expected):
+    names = ["Zeltros", "Zolan", "Rzz", "Rzzz", "R99", "R0", "100% Mon Cala", "1000 Moons", "Rx",
+             "\U0010ffff\U0010ffff", "Naboo", "Naboo\ud7ff\ue000", "Naboo\ue000", "[", "{"]
+    session.add_all(Planets(name=name, population=0) for name in names)
+    session.commit()
+    response = client.get('/planets', query_string={'name__prefix': prefix})
+    assert response.status_code == 200
+    assert sorted(row['name'] for row in response.json['data']) == expected
+
+def test_next_prefix():
+    assert next_prefix("Ta") == "Tb"
+    assert next_prefix("z") == "{"
+    assert next_prefix("a\U0010ffff") == "b"
+    assert next_prefix("\U0010ffff") is None
+    assert next_prefix("\ud7ff") == "\ue000"
+    assert next_prefix("a\ud7ff") == "a\ue000"
+
+def query_plan(app, model, path):
+    with app.test_request_context(path):
+        statement, _ = page_statement(model)
+        sql = str(statement.compile(db.engine, compile_kwargs={"literal_binds": True}))
+        return [row[-1] for row in db.session.execute(text("EXPLAIN QUERY PLAN " + sql))]
+
+@pytest.mark.parametrize('model, path, index', [
+    (Characters, '/people?specie=Human', 'ix_character_specie'),
+    (Characters, '/people?specie__prefix=Hu', 'ix_character_specie'),
+    (Characters, f"/people?sort=specie&after={encode_cursor('Human', 10)}", 'ix_character_specie'),
+    (Planets, '/planets?climate=arid', 'ix_planets_climate'),
+    (Planets, f"/planets?sort=climate&after={encode_cursor('arid', 10)}", 'ix_planets_climate'),
+    (Planets, f"/planets?sort=-climate&after={encode_cursor('arid', 10)}", 'ix_planets_climate'),
+    (Planets, f"/planets?sort=climate&after={encode_cursor(None, 10)}", 'ix_planets_climate'),
+    (Planets, '/planets?population__gte=1000&population__lt=2000', 'ix_planets_population'),
+    (Planets, f"/planets?sort=population&after={encode_cursor(1000, 10)}", 'ix_planets_population'),
+    (Vehicle, f"/vehicles?sort=max_speed&after={encode_cursor(500, 10)}", 'ix_vehicle_max_speed'),
+    (Vehicle, f"/vehicles?sort=-max_speed&after={encode_cursor(500, 10)}", 'ix_vehicle_max_speed'),
+])
+def test_filters_and_cursors_search_the_index(app, model, path, index):
+    plan = query_plan(app, model, path)
+    searches = [step for step in plan if step.startswith('SEARCH ')]
+    assert searches and all(f'USING INDEX {index} (' in step for step in searches), plan
+    assert not any(step.startswith('SCAN ') and model.__tablename__ in step for step in plan), plan
@@ -0,0 +1,56 @@
+import json
+import os
+import pytest
+import metrics
+
+LABELS = json.dumps({"endpoint": "api.get_planets", "method": "GET", "status": 200}, sort_keys=True)
+
+@pytest.fixture
+def metrics_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_DIR', str(tmp_path))
+    monkeypatch.setattr(metrics, '_data', {})
+    return tmp_path
+
+def write_snapshot(directory, pid, id, count):
+    series = {LABELS: {"buckets": [count] * len(metrics.COUNT_BUCKETS), "sum": float(count), "count": count}}
+    with open(directory / f'worker-{pid}.json', 'w') as file:
+        json.dump({"id": id, "metrics": {'http_request_queries': series}}, file)
+
+def total(name='http_request_queries'):
+    return metrics.collect().get(name, {}).get(LABELS, {}).get("count", 0)
+
+def test_exited_workers_are_folded_into_the_archive(metrics_dir):
+    write_snapshot(metrics_dir, 101, "101-a", 5)
+    write_snapshot(metrics_dir, 102, "102-a", 7)
+    assert total() == 12
+
+    metrics.archive_worker(101)
+    assert not (metrics_dir / 'worker-101.json').exists()
+    assert total() == 12
+
+    # the system reuses the pid for a new worker, which starts from zero
+    write_snapshot(metrics_dir, 101, "101-b", 1)
+    assert total() == 13
+    metrics.archive_worker(101)
+    metrics.archive_worker(102)
+    assert sorted(os.listdir(metrics_dir)) == ['archive.json', f'worker-{os.getpid()}.json']
+    assert total() == 13
+
+def test_snapshot_read_while_it_is_archived_counts_once(metrics_dir, monkeypatch):
+    write_snapshot(metrics_dir, 101, "101-a", 5)
+    read_json = metrics.read_json
+    archived = []
+
+    def archive_after_reading_snapshots(path):
+        # the master archives the worker between the two reads of collect
+        if path.endswith(metrics.ARCHIVE) and not archived:
+            archived.append(101)
+            metrics.archive_worker(101)
+        return read_json(path)
+
+    monkeypatch.setattr(metrics, 'read_json', archive_after_reading_snapshots)
+    assert total() == 5
+
+def test_archive_worker_without_snapshot(metrics_dir):
+    metrics.archive_worker(999)
+    assert total() == 0
@@ -0,0 +1,55 @@
+import os
+import time
+import pytest
+from app import create_app
+from models import db, Planets
+from replica import REPLICA, READ_YOUR_WRITES_HEADER, READ_YOUR_WRITES_WINDOW
+
+@pytest.fixture
+def replica_app(app, session, tmp_path):
+    # the primary and a "replica" that is never updated, each with its own planet 1
+    replica_app = create_app({
+        'ENABLE_ADMIN': False,
+        'SQLALCHEMY_BINDS': {REPLICA: {'url': f"sqlite:///{tmp_path / 'replica.db'}"}},
+    })
+    session.add(Planets(id=1, name="Primary", population=1))
+    session.commit()
+    with replica_app.app_context():
+        db.metadata.create_all(db.engines[REPLICA])
+        with db.engines[REPLICA].begin() as connection:
+            connection.execute(Planets.__table__.insert().values(id=1, name="Replica", population=1))
+    yield replica_app
+    # init_app registered a metadata for the bind on the shared db, the other
+    # apps do not have it
+    db.metadatas.pop(REPLICA, None)
+    os.remove(tmp_path / 'replica.db')
+
+def test_write_response_pins_cross_origin_reads_to_the_primary(replica_app):
+    # a cross-origin browser client: no cookies
+    client = replica_app.test_client(use_cookies=False)
+    assert client.get('/planets/1').json['name'] == "Replica"
+
+    response = client.put('/planets/1', json={"population": 2}, headers={'Origin': 'https://front.example'})
+    assert response.status_code == 200
+    until = response.headers[READ_YOUR_WRITES_HEADER]
+    assert READ_YOUR_WRITES_HEADER in response.headers['Access-Control-Expose-Headers']
+
+    response = client.get('/planets/1', headers={READ_YOUR_WRITES_HEADER: until})
+    assert response.json == {"id": 1, "name": "Primary", "population": 2, "climate": None}
+    assert client.get('/planets/1').json['name'] == "Replica"
+
+def test_same_origin_reads_follow_the_cookie(replica_app):
+    client = replica_app.test_client()
+    client.put('/planets/1', json={"population": 2})
+    assert client.get('/planets/1').json['name'] == "Primary"
+
+@pytest.mark.parametrize('until', [
+    lambda: str(time.time() - 1),
+    lambda: str(time.time() + 10 * READ_YOUR_WRITES_WINDOW),
+    lambda: "inf",
+    lambda: "nan",
+    lambda: "soon",
+])
+def test_expired_or_forged_header_reads_from_the_replica(replica_app, until):
+    client = replica_app.test_client(use_cookies=False)
+    assert client.get('/planets/1', headers={READ_YOUR_WRITES_HEADER: until()}).json['name'] == "Replica"
@@ -0,0 +1,74 @@
+import pytest
+from sqlalchemy import text, update
+from models import Characters, Planets, Vehicle
+
+@pytest.fixture
+def entities(session):
+    session.add_all([Characters(id=1, first_name="Luke", last_name="Skywalker", specie="Human", height=172),
+                     Planets(id=1, name="Tatooine", population=200000, climate="arid"),
+                     Vehicle(id=1, name="Speeder", max_speed=500)])
+    session.commit()
+
+def changes(session):
+    return session.execute(text("SELECT total_changes()")).scalar()
+
+@pytest.mark.parametrize('model', [Characters, Planets, Vehicle], ids=lambda model: model.__name__)
+def test_favorite_count_update_leaves_the_search_index_alone(session, entities, model):
+    before = changes(session)
+    session.execute(update(model).where(model.id == 1).values(favorite_count=model.favorite_count + 1))
+    assert changes(session) - before == 1
+    session.commit()
+
+def test_searched_column_update_replaces_the_document(client, session, entities):
+    assert [result['item']['name'] for result in client.get('/search?q=tatoo').json['data']] == ["Tatooine"]
+    session.execute(update(Planets).where(Planets.id == 1).values(name="Jakku"))
+    session.commit()
+    assert client.get('/search?q=tatoo').json['data'] == []
+    assert [result['item']['name'] for result in client.get('/search?q=jakku').json['data']] == ["Jakku"]
+
+@pytest.fixture
+def naboo(session):
+    session.add_all([Characters(id=1, first_name="Padme", last_name="Naboo", specie="Human", height=165),
+                     Characters(id=2, first_name="Jar Jar", last_name="Binks", specie="Gungan", height=196),
+                     Planets(id=1, name="Naboo", population=4500000000, climate="temperate"),
+                     Planets(id=2, name="Hoth", population=0, climate="frozen"),
+                     Vehicle(id=1, name="Naboo Royal Starship", max_speed=920),
+                     Vehicle(id=2, name="Naboo N-1 Starfighter Naboo", max_speed=1100)])
+    session.commit()
+
+def test_results_of_every_type_ranked_together(client, naboo):
+    data = client.get('/search?q=naboo').json['data']
+    assert {(result['type'], result['id']) for result in data} == {
+        ('people', 1), ('planets', 1), ('vehicles', 1), ('vehicles', 2)}
+    ranks = [result['rank'] for result in data]
+    assert ranks == sorted(ranks)
+    # the document that repeats the word ranks best
+    assert (data[0]['type'], data[0]['id']) == ('vehicles', 2)
+    planet = next(result for result in data if result['type'] == 'planets')
+    assert planet['item'] == {"id": 1, "name": "Naboo", "population": 4500000000, "climate": "temperate"}
+
+def test_prefix_and_every_word(client, naboo):
+    assert [result['item']['name'] for result in client.get('/search?q=star naboo roy').json['data']] == [
+        "Naboo Royal Starship"]
+    assert client.get('/search?q=tatooine').json == {'data': [], 'next': None}
+
+def test_pages_follow_the_ranking(client, naboo):
+    everything = client.get('/search?q=naboo').json['data']
+    keys = []
+    after = None
+    while True:
+        response = client.get('/search?q=naboo&limit=1' + (f'&after={after}' if after else ''))
+        assert response.status_code == 200
+        keys += [(result['type'], result['id']) for result in response.json['data']]
+        after = response.json['next']
+        if after is None:
+            break
+    assert keys == [(result['type'], result['id']) for result in everything]
+
+def test_missing_index_is_a_503(client, session, naboo):
+    # a database made with create_all, the index was never built
+    session.execute(text("DROP TABLE search_index"))
+    session.commit()
+    response = client.get('/search?q=naboo')
+    assert response.status_code == 503
+    assert 'flask search-index' in response.json['message']
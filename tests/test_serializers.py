@@ -0,0 +1,51 @@
+import pytest
+from flask import jsonify, current_app
+import serializers
+from serializers import serialize_fields, select_fields, rows_to_dicts, get_fields, json_response
+from models import (User, Characters, Planets, Vehicle, FavoriteCharacters, FavoritePlanets, FavoriteVehicles)
+
+MODELS = (User, Characters, Planets, Vehicle, FavoriteCharacters, FavoritePlanets, FavoriteVehicles)
+
+@pytest.fixture(params=['orjson', 'json'])
+def encoder(request, monkeypatch):
+    if request.param == 'orjson':
+        pytest.importorskip('orjson')
+    else:
+        monkeypatch.setattr(serializers, 'orjson', None)
+    return request.param
+
+@pytest.fixture
+def rows(session):
+    # non ASCII text, quotes, control characters and NULLs in every nullable column
+    session.add_all([
+        User(id=1, user_name="Padmé", email="padme@naboo.example", password="x", is_active=True),
+        User(id=2, user_name="\"Quote\" \\ back", email="q@example.com", password="x", is_active=False),
+        Characters(id=1, first_name="Łuke 天行者", last_name=None, specie="Humañ", height=172),
+        Characters(id=2, first_name="R2-D2\n\t", last_name="Ünit 🤖", specie="Droid", height=96),
+        Planets(id=1, name="Tatooine", population=200000, climate=None),
+        Planets(id=2, name="Kashyyyk ☀", population=0, climate="trópical  "),
+        Vehicle(id=1, name="Speeder", max_speed=500, driver_id=None),
+        Vehicle(id=2, name="X-wing ✈", max_speed=1050, driver_id=1),
+    ])
+    session.flush()
+    session.add_all([
+        FavoriteCharacters(id=1, user_id=1, character_id=2),
+        FavoritePlanets(id=1, user_id=1, planet_id=2),
+        FavoriteVehicles(id=1, user_id=2, vehicle_id=1),
+    ])
+    session.commit()
+
+@pytest.mark.parametrize('model', MODELS, ids=lambda model: model.__name__)
+def test_rows_serialize_like_jsonify(app, session, rows, encoder, model):
+    with app.test_request_context():
+        fields = serialize_fields(model)
+        fast = current_app.make_response(
+            json_response(rows_to_dicts(session.execute(select_fields(model).order_by(model.id)), fields)))
+        instances = session.query(model).order_by(model.id).all()
+        assert fast.status_code == 200
+        assert fast.get_data() == jsonify([instance.serialize() for instance in instances]).get_data()
+        assert fast.mimetype == 'application/json'
+
+        for instance in instances:
+            fast = current_app.make_response(json_response(get_fields(model, instance.id)))
+            assert fast.get_data() == jsonify(instance.serialize()).get_data()
@@ -0,0 +1,57 @@
+from models import Planets, Vehicle, Characters
+from versioning import get_version
+
+def test_admin_edit_invalidates_etag(client, session):
+    session.add(Planets(id=2, name="Alderaan", population=2000000000, climate="temperate"))
+    session.commit()
+    response = client.get('/planets/2')
+    etag = response.headers['ETag']
+    assert client.get('/planets/2', headers={'If-None-Match': etag}).status_code == 304
+
+    response = client.post('/admin/planets/edit/?id=2', data={
+        'name': "Alderaan II", 'population': '2000000000', 'climate': "temperate"})
+    assert response.status_code == 302
+
+    response = client.get('/planets/2', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.json['name'] == "Alderaan II"
+    assert response.headers['ETag'] != etag
+
+def test_every_flush_bumps_the_versions_of_its_tables(app, session):
+    planet = Planets(name="Hoth", population=0)
+    session.add(planet)
+    session.commit()
+    assert get_version(Planets) == 1
+
+    planet.climate = "frozen"
+    session.commit()
+    assert get_version(Planets) == 2
+
+    # a flush without changes to the row leaves the version alone
+    assert planet.climate == "frozen"
+    planet.climate = "frozen"
+    planet.favorite_by = []
+    session.commit()
+    assert get_version(Planets) == 2
+
+    session.delete(planet)
+    session.commit()
+    assert get_version(Planets) == 3
+    assert get_version(Characters) == get_version(Vehicle) == 0
+
+def test_api_write_bumps_the_version_once(client, session):
+    session.add(Vehicle(id=1, name="Speeder", max_speed=500))
+    session.commit()
+    assert get_version(Vehicle) == 1
+    assert client.put('/vehicles/1', json={"max_speed": 600}).status_code == 200
+    assert get_version(Vehicle) == 2
+
+def test_batch_write_bumps_the_version(client, session):
+    session.add(Vehicle(id=1, name="Speeder", max_speed=500))
+    session.commit()
+    response = client.post('/batch', json=[{"method": "PUT", "path": "/vehicles/1", "body": {"max_speed": 600}},
+                                           {"method": "GET", "path": "/vehicles/1"}])
+    assert response.status_code == 200
+    assert response.json['responses'][1]['body']['max_speed'] == 600
+    session.expire_all()
+    assert get_version(Vehicle) == 2